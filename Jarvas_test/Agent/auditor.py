@@ -0,0 +1,106 @@
+import re
+import threading
+from collections import Counter
+from logging import info
+
+
+# Flag formats of the usual CTF platforms.
+FLAG_PATTERN = re.compile(r"\b(?:picoCTF|flag|CTF|HTB|THM|DUCTF)\{[^{}\s]{1,200}\}", re.IGNORECASE)
+
+# Text of the failures produced by the tools, handle_tool_errors and tool_node.
+FAILURE_PATTERN = re.compile(r"^(?:Error\b|An unexpected error occurred)|Access Denied|does not exist|"
+                             r"No such file or directory|timed out after|never started", re.IGNORECASE)
+
+# Fields holding what a tool printed, depending on the tool.
+OUTPUT_FIELDS = ("terminal", "output")
+
+# How often each path fired: local_complete, local_incomplete, llm.
+AUDIT_COUNTS = Counter()
+_counts_lock = threading.Lock()
+
+
+def _count(path: str) -> None:
+    with _counts_lock:
+        AUDIT_COUNTS[path] += 1
+    info(f"auditor: {path} ({dict(AUDIT_COUNTS)})")
+
+
+def audit_counts() -> dict:
+    with _counts_lock:
+        return dict(AUDIT_COUNTS)
+
+
+def _observation(message):
+    """The raw tool result kept in the ToolMessage artifact, its text when there is none."""
+    return message.artifact if message.artifact is not None else message.content
+
+
+def _failure(obs) -> str | None:
+    """Reason when the result is clearly a failure, None otherwise."""
+    if isinstance(obs, str):
+        return obs.strip()[:300] if FAILURE_PATTERN.search(obs) else None
+
+    if not isinstance(obs, dict):
+        return None
+
+    output = "".join(str(obs.get(field) or "") for field in OUTPUT_FIELDS).strip()
+    error = str(obs.get("error") or "").strip()
+
+    if obs.get("status") == "Error" and not output:
+        return error[:300] or "the command failed"
+    if error and not output:
+        return error[:300]
+    if FAILURE_PATTERN.search(output) and len(output) < 300:
+        return output
+    if not output and not error and "details" not in obs and any(field in obs for field in OUTPUT_FIELDS):
+        return "the command printed nothing"
+    return None
+
+
+def is_placeholder(flag: str) -> bool:
+    """Template flags of challenge texts and help outputs: picoCTF{...}, flag{xxx}, flag{<your_answer>}, CTF{___}."""
+    body = flag[flag.index("{") + 1:-1]
+    return ("..." in body or "\u2026" in body
+            or len(set(body.lower())) == 1
+            or (body.startswith("<") and body.endswith(">"))
+            or not any(c.isalnum() for c in body))
+
+
+def _flags(obs, request: str = "") -> list[str]:
+    """Flags of a tool result, without placeholders and without the ones the request itself quotes."""
+    text = obs if isinstance(obs, str) else str(obs)
+    quoted = {flag.lower() for flag in FLAG_PATTERN.findall(request)}
+    return list(dict.fromkeys(flag for flag in FLAG_PATTERN.findall(text)
+                              if not is_placeholder(flag) and flag.lower() not in quoted))
+
+
+def precheck(tool_messages: list, request: str = "") -> tuple[str, str] | None:
+    """
+    Settles the clear-cut results of a tool turn without the LLM auditor.
+
+    - a flag in any output: complete. Placeholders (picoCTF{...}) and flags quoted in the request text
+      (a tool may echo it) do not count
+    - every call failed (error, access denied, missing file, no output): incomplete
+    - anything else: None, the ResultValidation LLM decides
+
+    :return: (status, notes), the ResultValidation contract
+    """
+    found, failures = [], []
+    for message in tool_messages:
+        obs = _observation(message)
+        name = message.name or "tool"
+        found += [(name, flag) for flag in _flags(obs, request)]
+        if (reason := _failure(obs)) is not None:
+            failures.append(f"{name}: {reason}")
+
+    if found:
+        _count("local_complete")
+        flags = ", ".join(f"{flag} (from {name})" for name, flag in found)
+        return "complete", f"Found the flag: {flags}."
+
+    if failures and len(failures) == len(tool_messages):
+        _count("local_incomplete")
+        return "incomplete", "Every tool call failed. " + " | ".join(failures)
+
+    _count("llm")
+    return None
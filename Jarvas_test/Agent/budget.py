@@ -0,0 +1,94 @@
+import json
+import time
+from logging import info
+from langchain_core.messages import ToolMessage
+from setup import (REQUEST_MAX_ITERATIONS, REQUEST_MAX_LLM_CALLS, REQUEST_MAX_SECONDS, REQUEST_MAX_TOOL_SECONDS,
+                   REQUEST_MAX_REPEATS)
+
+
+# Tool results quoted in the partial answer, and how much of each.
+PARTIAL_RESULTS = 5
+PARTIAL_RESULT_CHARS = 400
+
+# Tools writing to the workspace (or the RAG store), the calls that ran before them may give other results after.
+WRITING_TOOLS = {"binwalk", "ffmpeg_extract", "update_data"}
+
+
+def new_budget() -> dict:
+    """
+    Spending of the request the worker is on, kept in MessagesState["budget"].
+    Plain values only, it is saved with the checkpoints.
+    """
+    return {
+        "started": time.time(),
+        "iterations": 0,        # worker LLM turns
+        "llm_calls": 0,         # worker and auditor calls
+        "tool_s": 0.0,          # seconds spent in tool_node
+        "calls": [],            # signatures of the tool calls already run, since the last write to the workspace
+        "repeats": 0,           # worker turns asking again for a call with the same arguments
+        "repeated": [],         # ids of the calls of the last turn tool_node answers without running them
+    }
+
+
+def open_budget(state) -> dict:
+    """Copy of the budget of the request, nodes return it updated."""
+    budget = state.get("budget") or new_budget()
+    return {**budget, "calls": list(budget["calls"]), "repeated": list(budget.get("repeated", []))}
+
+
+def recursion_limit() -> int:
+    """Graph steps allowed per call, a tool turn is 3 steps (worker, tools, worker) so the budget stops first."""
+    return max(25, REQUEST_MAX_ITERATIONS * 3 + 10)
+
+
+def call_signature(tc: dict) -> str:
+    return f"{tc['name']}:{json.dumps(tc['args'], sort_keys=True, default=str)}"
+
+
+def writes_workspace(tc: dict) -> bool:
+    if tc['name'] == "steghide":
+        return tc['args'].get("option") != "info"
+    return tc['name'] in WRITING_TOOLS
+
+
+def record_calls(calls: list, tool_calls: list) -> list:
+    """
+    Signatures of the calls already run once tool_calls ran. A call writing to the workspace forgets
+    the others: ls, grep, file... may find something new after it.
+    """
+    if any(writes_workspace(tc) for tc in tool_calls):
+        return [call_signature(tc) for tc in tool_calls if writes_workspace(tc)]
+    return calls + [call_signature(tc) for tc in tool_calls]
+
+
+def exhausted(budget: dict) -> str | None:
+    """Reason when a limit is reached, None while the worker may go on. A limit of 0 is disabled."""
+    elapsed = time.time() - budget["started"]
+    limits = (
+        (REQUEST_MAX_ITERATIONS, budget["iterations"], f"{budget['iterations']} worker iterations"),
+        (REQUEST_MAX_LLM_CALLS, budget["llm_calls"], f"{budget['llm_calls']} LLM calls"),
+        (REQUEST_MAX_SECONDS, elapsed, f"{elapsed:.0f}s spent on the request"),
+        (REQUEST_MAX_TOOL_SECONDS, budget["tool_s"], f"{budget['tool_s']:.0f}s of tool runtime"),
+        (REQUEST_MAX_REPEATS, budget["repeats"], f"{budget['repeats']} repeated tool calls"),
+    )
+    for limit, spent, reason in limits:
+        if limit and spent >= limit:
+            info(f"request budget exhausted: {reason}")
+            return reason
+    return None
+
+
+def partial_result(messages: list, request_index: int | None, reason: str) -> str:
+    """What the worker found before it was stopped: the latest tool results of the request."""
+    results = [m for m in messages[request_index or 0:] if isinstance(m, ToolMessage)][-PARTIAL_RESULTS:]
+
+    lines = [f"Stopped before finishing the request ({reason})."]
+    if not results:
+        lines.append("No tool produced a result.")
+    else:
+        lines.append("Latest results:")
+        for message in results:
+            content = message.content if isinstance(message.content, str) else str(message.content)
+            cut = content[:PARTIAL_RESULT_CHARS] + ("..." if len(content) > PARTIAL_RESULT_CHARS else "")
+            lines.append(f"- {message.name}: {cut}")
+    return "\n".join(lines)
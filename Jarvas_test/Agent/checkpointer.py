@@ -0,0 +1,357 @@
+import asyncio
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterator, AsyncIterator, Sequence
+from logging import debug
+from pathlib import Path
+from typing import Any
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from setup import CHECKPOINT_RETENTION
+
+
+current_file_dir = Path(__file__).resolve().parent
+
+# Sessions survive restarts, they live next to the other local stores.
+checkpoint_storage_path = current_file_dir.parent / "Documents" / "Sessions" / "checkpoints.sqlite3"
+
+# Append-only channels stored as deltas: one row per message instead of the whole list per checkpoint.
+DELTA_CHANNELS = ("messages",)
+
+# Serialized values above this size are zlib compressed (large ToolMessage payloads).
+COMPRESS_THRESHOLD = 4096
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver[str]):
+
+    """
+    SQLite checkpointer that keeps long sessions small.
+
+    - messages are stored once, as an append-only log per thread, checkpoints only record how many
+      of them they contain
+    - other channels are stored once per version, like InMemorySaver does
+    - large payloads are compressed
+    - only the newest `retention` checkpoints of a thread are kept
+
+    Loading a checkpoint reads the latest snapshot and the message log, never the older checkpoints.
+    """
+
+    def __init__(self, storage_p=checkpoint_storage_path, retention: int = CHECKPOINT_RETENTION, *, serde=None):
+        super().__init__(serde=serde)
+        self.retention = retention
+        self._lock = threading.RLock()
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (thread_id, ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL,
+                ns TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data BLOB,
+                PRIMARY KEY (thread_id, ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                thread_id TEXT NOT NULL,
+                ns TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (thread_id, ns, seq)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data BLOB,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, ns, checkpoint_id, task_id, idx)
+            );
+        """)
+        self._conn.commit()
+
+    # ---------- serialization ----------
+
+    def _dump(self, value) -> tuple[str, bytes]:
+        """Serializes with the graph serializer, compressing large payloads ("z:" type prefix)."""
+        type_, data = self.serde.dumps_typed(value)
+        if data is not None and len(data) > COMPRESS_THRESHOLD:
+            return f"z:{type_}", zlib.compress(data)
+        return type_, data
+
+    def _load(self, type_: str, data: bytes):
+        if type_.startswith("z:"):
+            return self.serde.loads_typed((type_[2:], zlib.decompress(data)))
+        return self.serde.loads_typed((type_, data))
+
+    # ---------- messages log ----------
+
+    def _append_messages(self, thread_id: str, ns: str, messages: list) -> bytes:
+        """Stores the messages not logged yet, returns the reference kept in place of the list."""
+        stored = self._conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE thread_id = ? AND ns = ?", (thread_id, ns)).fetchone()[0]
+
+        dumped_last = None
+        if 0 < stored <= len(messages):
+            dumped_last = self._dump(messages[stored - 1])
+            digest = self._conn.execute(
+                "SELECT digest FROM messages WHERE thread_id = ? AND ns = ? AND seq = ?",
+                (thread_id, ns, stored - 1)).fetchone()[0]
+            if digest != hashlib.sha1(dumped_last[1]).hexdigest():
+                stored = -1
+        elif stored > len(messages):
+            stored = -1
+
+        if stored < 0:
+            # History was rewritten (not append-only), log it again from the start.
+            self._conn.execute("DELETE FROM messages WHERE thread_id = ? AND ns = ?", (thread_id, ns))
+            stored = 0
+
+        rows = []
+        for seq in range(stored, len(messages)):
+            type_, data = self._dump(messages[seq])
+            rows.append((thread_id, ns, seq, hashlib.sha1(data).hexdigest(), type_, data))
+        self._conn.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        return str(len(messages)).encode()
+
+    def _read_messages(self, thread_id: str, ns: str, count: int) -> list:
+        cursor = self._conn.execute(
+            "SELECT type, data FROM messages WHERE thread_id = ? AND ns = ? AND seq < ? ORDER BY seq",
+            (thread_id, ns, count))
+        return [self._load(type_, data) for type_, data in cursor]
+
+    # ---------- loading ----------
+
+    def _load_blobs(self, thread_id: str, ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        values = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT type, data FROM blobs WHERE thread_id = ? AND ns = ? AND channel = ? AND version = ?",
+                (thread_id, ns, channel, str(version))).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            if row[0] == "delta":
+                values[channel] = self._read_messages(thread_id, ns, int(row[1]))
+            else:
+                values[channel] = self._load(*row)
+        return values
+
+    def _make_tuple(self, thread_id: str, ns: str, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        checkpoint = self._load(type_, data)
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, data FROM writes WHERE thread_id = ? AND ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx", (thread_id, ns, checkpoint_id)).fetchall()
+
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(thread_id, ns, checkpoint["channel_versions"]),
+            },
+            metadata=self._load(metadata_type, metadata),
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, self._load(w_type, w_data))
+                            for task_id, channel, w_type, w_data in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND ns = ? AND checkpoint_id = ?",
+                    (thread_id, ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND ns = ? "
+                    f"ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, ns)).fetchone()
+            if row is None:
+                return None
+            return self._make_tuple(thread_id, ns, row)
+
+    def list(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+             before: RunnableConfig | None = None, limit: int | None = None) -> Iterator[CheckpointTuple]:
+        query = "SELECT thread_id, ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata " \
+                "FROM checkpoints WHERE 1 = 1"
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query += " AND ns = ?"
+                params.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for thread_id, ns, *row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                if filter:
+                    metadata = self._load(row[4], row[5])
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                item = self._make_tuple(thread_id, ns, row)
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    # ---------- saving ----------
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"]["checkpoint_ns"]
+        snapshot = checkpoint.copy()
+        values = snapshot.pop("channel_values")
+
+        with self._lock:
+            for channel, version in new_versions.items():
+                if channel not in values:
+                    type_, data = "empty", None
+                elif channel in DELTA_CHANNELS and isinstance(values[channel], list):
+                    type_, data = "delta", self._append_messages(thread_id, ns, values[channel])
+                else:
+                    type_, data = self._dump(values[channel])
+                self._conn.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                                   (thread_id, ns, channel, str(version), type_, data))
+
+            type_, data = self._dump(snapshot)
+            metadata_type, metadata_data = self._dump(get_checkpoint_metadata(config, metadata))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, data, metadata_type, metadata_data, time.time()))
+
+            self._prune(thread_id, ns)
+            self._conn.commit()
+
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        with self._lock:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                type_, data = self._dump(value)
+                # Regular writes are kept once, special ones (errors, interrupts) replace the previous.
+                verb = "INSERT OR IGNORE" if idx >= 0 else "INSERT OR REPLACE"
+                self._conn.execute(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (thread_id, ns, checkpoint_id, task_id, idx, channel, type_, data, task_path))
+            self._conn.commit()
+
+    def _prune(self, thread_id: str, ns: str) -> None:
+        """Retention: drops checkpoints past the newest `retention`, with their writes and unused blobs."""
+        if not self.retention:
+            return
+
+        old = [row[0] for row in self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?", (thread_id, ns, self.retention))]
+        if not old:
+            return
+
+        for checkpoint_id in old:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND ns = ? AND checkpoint_id = ?",
+                               (thread_id, ns, checkpoint_id))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ? AND ns = ? AND checkpoint_id = ?",
+                               (thread_id, ns, checkpoint_id))
+
+        # Versions only grow, blobs older than what the oldest kept checkpoint uses are unreachable.
+        oldest = self._conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND ns = ? "
+            "ORDER BY checkpoint_id ASC LIMIT 1", (thread_id, ns)).fetchone()
+        for channel, version in self._load(*oldest)["channel_versions"].items():
+            self._conn.execute("DELETE FROM blobs WHERE thread_id = ? AND ns = ? AND channel = ? AND version < ?",
+                               (thread_id, ns, channel, str(version)))
+        debug(f"pruned {len(old)} checkpoints of thread {thread_id}")
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "messages", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---------- async, SQLite calls run off the event loop ----------
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None,
+                    before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,76 @@
+from logging import debug
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from setup import OLD_TOOL_OUTPUT_CHARS
+
+
+def count_tokens(messages) -> int:
+    """Cheap local estimate (about 4 characters per token), no call to the model."""
+    return count_tokens_approximately(messages)
+
+
+def _group(messages: list) -> list[list]:
+    """
+    Splits the history into units that must stay together: an AIMessage with tool calls and the
+    ToolMessages answering it. ToolMessages without their trigger are dropped, the LLM APIs reject them.
+    """
+    units = []
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            trigger = units[-1][0] if units else None
+            if isinstance(trigger, AIMessage) and any(tc["id"] == message.tool_call_id
+                                                      for tc in trigger.tool_calls):
+                units[-1].append(message)
+            continue
+        units.append([message])
+    return units
+
+
+def _shrink(message):
+    """Old tool outputs are cut down to their start, the worker already reasoned over them."""
+    if not isinstance(message, ToolMessage):
+        return message
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    if len(content) <= OLD_TOOL_OUTPUT_CHARS:
+        return message
+    cut = f"{content[:OLD_TOOL_OUTPUT_CHARS]}\n...[old tool output truncated, {len(content)} characters in total]"
+    return message.model_copy(update={"content": cut})
+
+
+def fit_context(messages: list, budget: int, pinned_index: int = None) -> list:
+    """
+    Newest part of the history that fits in budget tokens.
+
+    - tool call / ToolMessage pairs are never split
+    - the newest unit is always kept whole, older tool outputs are truncated
+    - messages[pinned_index] (the user message that started the request) is always kept
+    - the window starts on a HumanMessage, as the Gemini API expects
+
+    :return: messages in chronological order
+    """
+    pinned = messages[pinned_index] if pinned_index is not None and 0 <= pinned_index < len(messages) else None
+    used = count_tokens([pinned]) if pinned is not None else 0
+
+    window = []
+    for position, unit in enumerate(reversed(_group(messages))):
+        if position > 0:
+            unit = [message if message is pinned else _shrink(message) for message in unit]
+        cost = count_tokens([message for message in unit if message is not pinned])
+        if window and used + cost > budget:
+            break
+        window.insert(0, unit)
+        used += cost
+
+    pinned_in_window = any(message is pinned for unit in window for message in unit)
+
+    if pinned is None or pinned_in_window:
+        # Without the pinned message in front, the window itself must open with a HumanMessage.
+        while len(window) > 1 and not isinstance(window[0][0], HumanMessage):
+            window.pop(0)
+
+    flat = [message for unit in window for message in unit]
+    if pinned is not None and not pinned_in_window:
+        flat.insert(0, pinned)
+
+    debug(f"context: {len(flat)} of {len(messages)} messages, ~{used} tokens (budget {budget})")
+    return flat
@@ -0,0 +1,120 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from logging import debug
+from pathlib import Path
+from langchain_core.embeddings import Embeddings
+from setup import EMBEDDING_CACHE_ITEMS
+
+
+current_file_dir = Path(__file__).resolve().parent
+
+# Vectors are stored next to the tool cache.
+embedding_cache_path = current_file_dir.parent / "Documents" / "Cache" / "embeddings.sqlite3"
+
+
+class CachedEmbeddings(Embeddings):
+
+    """
+    Embeddings wrapper that never embeds the same text twice.
+    Vectors are keyed on (model name, kind, sha256 of the text) and stored as float32 blobs in SQLite,
+    with an in-memory LRU on top for repeated queries.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, storage_p=embedding_cache_path,
+                 memory_items: int = EMBEDDING_CACHE_ITEMS):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, kind, digest)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _remember(self, key: tuple, vector: list[float]) -> None:
+        """Adds to the LRU layer. Caller holds the lock."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, kind: str, digests: list[str]) -> dict:
+        """Vectors already known for these digests, from memory first, then from disk."""
+        found = {}
+        with self._lock:
+            missing = []
+            for digest in digests:
+                key = (kind, digest)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[digest] = self._memory[key]
+                else:
+                    missing.append(digest)
+
+            for start in range(0, len(missing), 500):       # stay under SQLite's variable limit
+                batch = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT digest, vector FROM embeddings WHERE model = ? AND kind = ? "
+                    f"AND digest IN ({','.join('?' * len(batch))})",
+                    (self.model_name, kind, *batch)
+                ).fetchall()
+                for digest, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[digest] = vector
+                    self._remember((kind, digest), vector)
+        return found
+
+    def _store(self, kind: str, vectors: dict) -> dict:
+        """Stores new vectors as float32, returns them as stored so hits and misses give the same values."""
+        packed = {digest: array("f", vector) for digest, vector in vectors.items()}
+        stored = {digest: values.tolist() for digest, values in packed.items()}
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                [(self.model_name, kind, digest, values.tobytes()) for digest, values in packed.items()]
+            )
+            self._conn.commit()
+            for digest, vector in stored.items():
+                self._remember((kind, digest), vector)
+        return stored
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        digests = [self._digest(text) for text in texts]
+        found = self._lookup("document", digests)
+
+        todo = {}
+        for digest, text in zip(digests, texts):
+            if digest not in found:
+                todo.setdefault(digest, text)
+
+        debug(f"embed_documents: {len(texts) - len(todo)} cached, {len(todo)} to embed")
+        if todo:
+            computed = dict(zip(todo, self.embeddings.embed_documents(list(todo.values()))))
+            found.update(self._store("document", computed))
+
+        return [found[digest] for digest in digests]
+
+    def embed_query(self, text: str) -> list[float]:
+        digest = self._digest(text)
+        found = self._lookup("query", [digest])
+        if digest in found:
+            return found[digest]
+
+        return self._store("query", {digest: self.embeddings.embed_query(text)})[digest]
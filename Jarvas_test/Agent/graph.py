@@ -1,19 +1,33 @@
-from langgraph.checkpoint.memory import InMemorySaver
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from langgraph.graph import StateGraph, START, END
-from langchain_core.messages import HumanMessage
-from Agent.nodes import worker_node, tool_node, supervisor_node, worker_decide, route_worker, MessagesState
+from langchain_core.messages import HumanMessage, AIMessageChunk
+from langchain_core.runnables import RunnableLambda
+from Agent.checkpointer import DeltaSqliteSaver
+from Agent.sessions import SessionStore, Session, DEFAULT_SESSION
+from Agent.nodes import (worker_node, tool_node, supervisor_node, aworker_node, atool_node, asupervisor_node,
+                         worker_decide, route_worker, MessagesState)
+from Utils.workspace import use_workspace
+from Agent.budget import recursion_limit
+from Utils.tracing import span, LLM_TRACER
+from setup import SESSION_MAX_ACTIVE
 
 
+# Graph steps, LLM tokens and tool progress (get_stream_writer in tool_node).
+STREAM_MODES = ["updates", "messages", "custom"]
 
-def make_agent():
 
-    checkpointer = InMemorySaver()
+def make_agent(checkpointer=None):
+
+    checkpointer = checkpointer or DeltaSqliteSaver()
 
     agent = StateGraph(MessagesState)
 
-    agent.add_node("supervisor", supervisor_node)
-    agent.add_node("worker", worker_node)
-    agent.add_node("tools", tool_node)
+    # Each node has a sync and an async body, invoke/stream use the first, ainvoke/astream the second.
+    agent.add_node("supervisor", RunnableLambda(supervisor_node, afunc=asupervisor_node, name="supervisor"))
+    agent.add_node("worker", RunnableLambda(worker_node, afunc=aworker_node, name="worker"))
+    agent.add_node("tools", RunnableLambda(tool_node, afunc=atool_node, name="tools"))
 
     agent.add_conditional_edges(    #Router decides if the worker should be called or not.
         "supervisor",
@@ -33,8 +47,20 @@ def make_agent():
     return agent_compiled
 
 class Jarvas:
+
+    """
+    Hosts several investigations (sessions) in one process.
+    The compiled graph, model clients, Chroma store and tool cache are shared. Each session has its
+    own thread in the checkpointer and its own workspace. Calls on different sessions run concurrently,
+    calls on the same session wait for each other.
+    """
+
     def __init__(self):
         self.agent = make_agent()
+        self.sessions = SessionStore()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._active = threading.BoundedSemaphore(SESSION_MAX_ACTIVE)   # graphs running at the same time
 
     def get_text(self,content) -> str:
         if isinstance(content, str):
@@ -43,13 +69,189 @@ class Jarvas:
             return "".join(part.get("text", "") for part in content if isinstance(part, dict))
         return str(content)
 
-    def call(self, message : str) -> str:
-        result = self.agent.invoke({"messages": [HumanMessage(content=message)]},
-                             {"configurable": {"thread_id": "1"}})
+    def _session_lock(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    def get_session(self, session_id: str) -> Session:
+        """Open session, raises otherwise. Checked again once the session lock is held, a close may have run meanwhile."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Session {session_id} does not exist.")
+        if session.closed:
+            raise ValueError(f"Session {session_id} is closed, resume it first.")
+        return session
+
+    #------SESSIONS--------
+    def create_session(self, name: str = None, working_dir: str = None) -> Session:
+        return self.sessions.create(name, working_dir)
+
+    def list_sessions(self, include_closed: bool = False) -> list[Session]:
+        return self.sessions.list(include_closed)
+
+    def resume_session(self, session_id: str) -> Session:
+        """Reopens a session, its history is read from the checkpointer on the next call."""
+        if self.sessions.get(session_id) is None:
+            raise ValueError(f"Session {session_id} does not exist.")
+        self.sessions.set_closed(session_id, False)
+        return self.sessions.get(session_id)
+
+    def close_session(self, session_id: str, delete: bool = False) -> None:
+        """
+        Closes a session once its running call is over.
+        :param delete: also drop its history from the checkpointer (the workspace files are kept)
+        """
+        with self._session_lock(session_id):
+            if delete:
+                self.agent.checkpointer.delete_thread(session_id)
+                self.sessions.delete(session_id)
+            else:
+                self.sessions.set_closed(session_id, True)
+        # The lock is kept: callers waiting on it must still exclude each other, and see the session closed.
 
+    @staticmethod
+    def _config(session_id: str) -> dict:
+        # LLM_TRACER sees every LLM call of the graph, for the trace of the request.
+        # The request budget ends worker loops, the recursion limit is only a backstop.
+        return {"configurable": {"thread_id": session_id}, "callbacks": [LLM_TRACER],
+                "recursion_limit": recursion_limit()}
+
+    def call(self, message : str, session_id: str = DEFAULT_SESSION) -> str:
+        self.get_session(session_id)
+
+        with self._session_lock(session_id), self._active:
+            session = self.get_session(session_id)
+            with use_workspace(session.working_dir), \
+                    span("request", "request", session=session_id, message_chars=len(message)):
+                result = self.agent.invoke({"messages": [HumanMessage(content=message)]},
+                                           self._config(session_id))
+        self.sessions.touch(session_id)
+
+        return self.get_text(result["messages"][-1].content)
+
+    @asynccontextmanager
+    async def _session_slot(self, session_id: str):
+        """Async side of the locks taken by call(), waiting for them does not block the event loop."""
+        async with _holding(self._session_lock(session_id)), _holding(self._active):
+            yield
+
+    async def acall(self, message: str, session_id: str = DEFAULT_SESSION) -> str:
+        self.get_session(session_id)
+
+        async with self._session_slot(session_id):
+            session = self.get_session(session_id)
+            with use_workspace(session.working_dir), \
+                    span("request", "request", session=session_id, message_chars=len(message)):
+                result = await self.agent.ainvoke({"messages": [HumanMessage(content=message)]},
+                                                  self._config(session_id))
+        self.sessions.touch(session_id)
 
         return self.get_text(result["messages"][-1].content)
 
+    #------STREAMING--------
+    def _events(self, mode: str, chunk, last: list):
+        """
+        Turns a LangGraph stream chunk into Jarvas events:
+        {"event": "node", "node"}, {"event": "token", "node", "text"}, {"event": "tool_start", "name", "id", "args"},
+        {"event": "tool_end", "name", "id", "seconds"}. last keeps the newest message, the final answer.
+        """
+        if mode == "updates":
+            for node, update in chunk.items():
+                messages = (update or {}).get("messages") if isinstance(update, dict) else None
+                if messages:
+                    last[:] = messages[-1:]
+                yield {"event": "node", "node": node}
+        elif mode == "messages":
+            message, metadata = chunk
+            # Only streamed LLM chunks, LangGraph also echoes the whole messages returned by the nodes.
+            text = self.get_text(message.content) if isinstance(message, AIMessageChunk) else ""
+            if text:
+                yield {"event": "token", "node": metadata.get("langgraph_node"), "text": text}
+        elif mode == "custom":
+            yield chunk
+
+    def stream(self, message: str, session_id: str = DEFAULT_SESSION):
+        """
+        Like call(), but yields events while the graph runs (see _events),
+        then {"event": "answer", "text"} with the text call() would return.
+        """
+        self.get_session(session_id)
+        last = []
+
+        with self._session_lock(session_id), self._active:
+            session = self.get_session(session_id)
+            with use_workspace(session.working_dir), \
+                    span("request", "request", session=session_id, message_chars=len(message)):
+                for mode, chunk in self.agent.stream({"messages": [HumanMessage(content=message)]},
+                                                     self._config(session_id),
+                                                     stream_mode=STREAM_MODES):
+                    yield from self._events(mode, chunk, last)
+        self.sessions.touch(session_id)
+
+        yield {"event": "answer", "text": self.get_text(last[0].content) if last else ""}
+
+    async def astream(self, message: str, session_id: str = DEFAULT_SESSION):
+        """Async stream(), same events."""
+        self.get_session(session_id)
+        last = []
+
+        async with self._session_slot(session_id):
+            session = self.get_session(session_id)
+            with use_workspace(session.working_dir), \
+                    span("request", "request", session=session_id, message_chars=len(message)):
+                async for mode, chunk in self.agent.astream({"messages": [HumanMessage(content=message)]},
+                                                            self._config(session_id),
+                                                            stream_mode=STREAM_MODES):
+                    for event in self._events(mode, chunk, last):
+                        yield event
+        self.sessions.touch(session_id)
+
+        yield {"event": "answer", "text": self.get_text(last[0].content) if last else ""}
+
+
+async def _acquire(lock) -> None:
+    """
+    Acquires a threading lock (or semaphore) from a coroutine without blocking the event loop.
+    The wait happens in a thread of its own: in the default executor, waiters would take the threads
+    the request holding the lock needs for its checkpoints and tools, and never get it.
+    """
+    if lock.acquire(blocking=False):
+        return
+
+    loop = asyncio.get_running_loop()
+    acquired = loop.create_future()
+
+    def settle():
+        if acquired.cancelled():
+            lock.release()      # the waiter is gone, nobody else will release it
+        else:
+            acquired.set_result(True)
+
+    def wait():
+        lock.acquire()
+        try:
+            loop.call_soon_threadsafe(settle)
+        except RuntimeError:
+            lock.release()      # event loop closed meanwhile
+
+    threading.Thread(target=wait, name="jarvas-lock-wait", daemon=True).start()
+    try:
+        await acquired
+    except asyncio.CancelledError:
+        if acquired.done() and not acquired.cancelled():
+            lock.release()      # acquired, but the task was cancelled before resuming
+        raise
+
+
+@asynccontextmanager
+async def _holding(lock):
+    """Holds a threading lock (or semaphore) from a coroutine, shared with the sync calls."""
+    await _acquire(lock)
+    try:
+        yield
+    finally:
+        lock.release()
+
 
 
 
@@ -1,46 +1,68 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_ollama import ChatOllama
-from langchain_ollama import OllamaEmbeddings
 from setup import API_KEY
+from Utils.lazy import LazyObject
+
+# Clients are built on first use, langchain integrations are only imported then.
 
 
 MODEL = "qwen3:1.7b-q4_K_M"
 
+EMBEDDING_MODEL = "qwen3-embedding:0.6b"
+
+
+def _gemini_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
-gemini_model = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=API_KEY,
-    model_kwargs={
-        "tool_config": {
-            "function_calling_config": {
-                "mode": "NONE"
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=API_KEY,
+        model_kwargs={
+            "tool_config": {
+                "function_calling_config": {
+                    "mode": "NONE"
+                }
             }
-        }
-    },
-    temperature= 0
-)
+        },
+        temperature= 0
+    )
+
+
+def _worker_gemini_model():
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
-worker_gemini_model = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=API_KEY,
-    temperature= 0
-)
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=API_KEY,
+        temperature= 0
+    )
 
 
-localLLM = ChatOllama(
-    model=MODEL,
-    temperature=0
-)
+def _local_llm():
+    from langchain_ollama import ChatOllama
 
-embedding_model = OllamaEmbeddings(
-    model="qwen3-embedding:0.6b",
-    validate_model_on_init=True
-)
+    return ChatOllama(
+        model=MODEL,
+        temperature=0
+    )
 
 
+def _embedding_model():
+    from langchain_ollama import OllamaEmbeddings
+    from Agent.embeddings import CachedEmbeddings
 
+    # Every chunk and query goes through the on-disk cache before reaching Ollama.
+    return CachedEmbeddings(
+        OllamaEmbeddings(
+            model=EMBEDDING_MODEL,
+            validate_model_on_init=True
+        ),
+        model_name=EMBEDDING_MODEL
+    )
 
 
+gemini_model = LazyObject(_gemini_model)
 
+worker_gemini_model = LazyObject(_worker_gemini_model)
 
+localLLM = LazyObject(_local_llm)
 
+embedding_model = LazyObject(_embedding_model)
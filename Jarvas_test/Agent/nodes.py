@@ -1,11 +1,25 @@
 from typing import TypedDict, Annotated, Literal
 import operator
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic
 from langgraph.graph import END
+from langgraph.config import get_stream_writer
+from langgraph.constants import TAG_NOSTREAM
+from langchain_core.runnables import RunnableLambda
 from langchain_core.messages import AnyMessage, HumanMessage, ToolMessage, AIMessage, SystemMessage
 from pydantic import BaseModel, Field
 from Utils.tools import TOOLS
-from Agent.models import gemini_model, worker_gemini_model
+from Agent.models import gemini_model, worker_gemini_model  #lazy, use .get(): LangGraph walks attribute chains of node globals at compile time.
+from Agent.runnables import RunnableRegistry
+from Agent.context import fit_context
+from Agent.router import IntentRouter, message_text
+from Agent.auditor import precheck
+from Agent.budget import new_budget, open_budget, exhausted, call_signature, record_calls, partial_result
+from Utils.tracing import span, trace_args, traced_node
 from logging import info, debug
+from setup import TOOL_MAX_WORKERS, TOOL_TIMEOUT, SUPERVISOR_CONTEXT_TOKENS, WORKER_CONTEXT_TOKENS
 from Agent.prompts import *
 
 
@@ -17,8 +31,10 @@ class MessagesState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
     message_type: str | None
     request: str | None
+    request_index: int | None     # position in messages of the user message that started the request
     next_step: Literal["worker",END]
-    status: Literal["complete","incomplete","request"]
+    status: Literal["complete","incomplete","request","blocked"]
+    budget: dict | None           # spending of the current request, see Agent/budget.py
 class MessageClassifier(BaseModel):
     message_type: Literal["perform_action", "informational"] = Field(
         ...,
@@ -41,20 +57,59 @@ class ResultValidation(BaseModel):
 
 
 
-def get_safe_context(messages, limit=5):
-    # Take the last 'limit' messages
-    slice_window = messages[-limit:]
+# Runnables reused across graph steps, rebuilt when the model instance or the TOOLS list changes.
+# Structured outputs are internal decisions, their tokens are kept out of the stream.
+RUNNABLES = RunnableRegistry()
+RUNNABLES.register("classifier",
+                   lambda: gemini_model.get().with_structured_output(MessageClassifier).with_config(tags=[TAG_NOSTREAM]),
+                   fingerprint=lambda: id(gemini_model.get()))
+RUNNABLES.register("auditor",
+                   lambda: gemini_model.get().with_structured_output(ResultValidation).with_config(tags=[TAG_NOSTREAM]),
+                   fingerprint=lambda: id(gemini_model.get()))
+
+
+def _bind_worker_tools():
+    # tool_node must know exactly the tools the worker was given.
+    tools_by_name.clear()
+    tools_by_name.update({tool.name: tool for tool in TOOLS})
+    return worker_gemini_model.get().bind_tools(TOOLS)
+
+RUNNABLES.register("worker",
+                   _bind_worker_tools,
+                   fingerprint=lambda: (id(worker_gemini_model.get()), tuple(id(t) for t in TOOLS)))
+
+
+ROUTER = IntentRouter()
+ROUTER_STEP = RunnableLambda(ROUTER.route, name="router")     #a runnable, so the async path runs it off the event loop
+
+
+def refresh_runnables():
+    """Rebuilds the cached runnables on next use, e.g. after changing a tool."""
+    RUNNABLES.refresh()
 
-    # If the first message in our slice is a ToolMessage,
-    # it's 'orphaned'. We should include the message before it too.
-    if slice_window and isinstance(slice_window[0], ToolMessage):
-        # Extend the slice back by one more to catch the AIMessage trigger
-        slice_window = messages[-(limit + 1):]
 
-    return slice_window
+# Node bodies are generators: they yield (runnable, input) for every LLM call and get the answer back.
+# The same body then drives the sync graph (invoke) and the async one (ainvoke).
+def _drive(steps):
+    try:
+        runnable, inputs = next(steps)
+        while True:
+            runnable, inputs = steps.send(runnable.invoke(inputs))
+    except StopIteration as done:
+        return done.value
+
+
+async def _adrive(steps):
+    try:
+        runnable, inputs = next(steps)
+        while True:
+            runnable, inputs = steps.send(await runnable.ainvoke(inputs))
+    except StopIteration as done:
+        return done.value
+
 
 # SUPERVISOR
-def supervisor_node(state: MessagesState) -> dict:
+def _supervisor_steps(state: MessagesState):
 
 
     # Check if response came from the Worker:
@@ -71,20 +126,20 @@ def supervisor_node(state: MessagesState) -> dict:
 
 
 
-    classifier_llm = gemini_model.with_structured_output(MessageClassifier)
-
-
-
-
-
-
-    classified = classifier_llm.invoke([CLASSIFIER_INSTRUCTION, last_message])
+    # Local router first, the classifier LLM only decides when the router is unsure.
+    text = message_text(last_message)
+    classified = yield ROUTER_STEP, text
+    if classified is None:
+        classified = yield RUNNABLES.get("classifier"), [CLASSIFIER_INSTRUCTION, last_message]
+        ROUTER.remember(text, classified.message_type, classified.request)
+    request = classified.request or text
     info(classified.message_type)
 
     if classified.message_type == "informational":
 
 
-        result = gemini_model.invoke([SUPERVISOR_INSTRUCTION] + state["messages"])
+        context = fit_context(state["messages"], SUPERVISOR_CONTEXT_TOKENS)
+        result = yield gemini_model.get(), [SUPERVISOR_INSTRUCTION] + context
         info(result)
 
 
@@ -92,18 +147,22 @@ def supervisor_node(state: MessagesState) -> dict:
         next_step = "worker" if state.get("status") == "request" else END
 
         return {
-            "request": classified.request,
+            "request": request,
             "messages": [result],
             "next_step": next_step
         }
 
 
     if classified.message_type == "perform_action":
-        return {
-            "request": classified.request,
+        update = {
+            "request": request,
             "next_step": "worker",
             "status": "incomplete"
         }
+        if state.get("status") != "request":    #a new user request, not a question coming back from the worker.
+            update["request_index"] = len(state["messages"]) - 1
+            update["budget"] = new_budget()
+        return update
 
 
 
@@ -114,6 +173,16 @@ def supervisor_node(state: MessagesState) -> dict:
     return {"next_step": END}
 
 
+@traced_node("supervisor")
+def supervisor_node(state: MessagesState) -> dict:
+    return _drive(_supervisor_steps(state))
+
+
+@traced_node("supervisor")
+async def asupervisor_node(state: MessagesState) -> dict:
+    return await _adrive(_supervisor_steps(state))
+
+
 
 
 def worker_decide(state: MessagesState) -> Literal["tools", "supervisor","worker"]:
@@ -138,11 +207,12 @@ def worker_decide(state: MessagesState) -> Literal["tools", "supervisor","worker
     return val
 
 
-def worker_node(state: MessagesState) -> dict:
+def _worker_steps(state: MessagesState):
     """Worker with tools."""
     latest_human = next((m for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), None)
     last_msg = state["messages"][-1]
     request = state.get("request")
+    budget = open_budget(state)
 
 
     info(f"received in worker_node: {last_msg}")
@@ -164,11 +234,16 @@ def worker_node(state: MessagesState) -> dict:
 
 
 
+        # Parallel tool calls answer together, the auditor needs every result of the trigger.
+        trigger_ids = {tc['id'] for tc in getattr(ai_trigger_msg, 'tool_calls', [])}
+        tool_results = [m for m in state["messages"]
+                        if isinstance(m, ToolMessage) and m.tool_call_id in trigger_ids] or [last_msg]
+
         eval_messages = [
             AUDITOR_INSTRUCTION,
             latest_human,
             ai_trigger_msg,
-            last_msg
+            *tool_results
         ]
 
         info(eval_messages)
@@ -176,19 +251,29 @@ def worker_node(state: MessagesState) -> dict:
 
         debug(f"Several info: tool: {last_msg.content}, human: {latest_human}")
 
-        evaluate = gemini_model.with_structured_output(ResultValidation)
-        eval_result = evaluate.invoke(eval_messages)
+        # Clear-cut results are settled locally, only the ambiguous ones cost an LLM call.
+        # Flags the user wrote (challenge text, examples) are not findings, even when a tool echoes them.
+        request_text = " ".join(str(m.content) for m in state["messages"][state.get("request_index") or 0:]
+                                if isinstance(m, HumanMessage))
+        settled = precheck(tool_results, request_text)
+        if settled is not None:
+            eval_result = ResultValidation(status=settled[0], notes=settled[1])
+        else:
+            evaluate = RUNNABLES.get("auditor")
+            budget["llm_calls"] += 1
+            eval_result = yield evaluate, eval_messages
 
         info(f"eval_results in worker_node: {eval_result}")
 
         if eval_result.status in ["complete", "request", "blocked"]:
-            return {"messages": [HumanMessage(content=f"{eval_result.notes}")], "status": eval_result.status}
+            return {"messages": [HumanMessage(content=f"{eval_result.notes}")], "status": eval_result.status,
+                    "budget": budget}
 
         if eval_result.status == "incomplete":
             print(f"[WORKER THINKING]: {eval_result.notes}")
             feedback = HumanMessage(
                 content=f"Attempt failed. Evaluator notes: {eval_result.notes}. Please try something else.")
-            return {"messages": [feedback], "status": "incomplete"}
+            return {"messages": [feedback], "status": "incomplete", "budget": budget}
 
     else:
         info("message is a human_message")
@@ -196,12 +281,22 @@ def worker_node(state: MessagesState) -> dict:
 
 
 
+    # Out of budget: the supervisor gets what was found so far instead of another round.
+    reason = exhausted(budget)
+    if reason is not None:
+        partial = partial_result(state["messages"], state.get("request_index"), reason)
+        return {"messages": [HumanMessage(content=partial)], "status": "blocked", "budget": budget}
+
+
     formatted_text = WORKER_INSTRUCTION.format(request=request)
     system_msg = SystemMessage(content=formatted_text)
 
 
     # Takes the request context and executes the request.
-    response = worker_gemini_model.bind_tools(TOOLS).invoke([system_msg] + state["messages"])
+    context = fit_context(state["messages"], WORKER_CONTEXT_TOKENS, pinned_index=state.get("request_index"))
+    budget["iterations"] += 1
+    budget["llm_calls"] += 1
+    response = yield RUNNABLES.get("worker"), [system_msg] + context
 
     info(f"response={response}")
     info(f"content= {response.content}")
@@ -212,34 +307,190 @@ def worker_node(state: MessagesState) -> dict:
     #request is gonna feed back into worker.
     if len(response.tool_calls) == 0:
         if "REQUEST" in response.content:
-            return {"messages": [HumanMessage(response.content)], "status":"request"} #prolematic line, it will always be request if there is no tool call.
-        return {"messages": [HumanMessage(response.content)], "status": "complete"}
+            return {"messages": [HumanMessage(response.content)], "status":"request", "budget": budget} #prolematic line, it will always be request if there is no tool call.
+        return {"messages": [HumanMessage(response.content)], "status": "complete", "budget": budget}
+
+    # Same tool, same arguments: the result is already in the history, running it again would loop.
+    # Only those calls are refused, tool_node runs the others.
+    seen, repeated = set(budget["calls"]), []
+    for tc in response.tool_calls:
+        signature = call_signature(tc)
+        if signature in seen:
+            repeated.append(tc)
+        seen.add(signature)
+    if repeated:
+        budget["repeats"] += 1
+        info(f"repeated tool calls: {[tc['name'] for tc in repeated]}")
+        reason = exhausted(budget)
+        if reason is not None:
+            partial = partial_result(state["messages"], state.get("request_index"), reason)
+            return {"messages": [HumanMessage(content=partial)], "status": "blocked", "budget": budget}
+        if len(repeated) == len(response.tool_calls):
+            feedback = HumanMessage(content=f"You already ran {', '.join(tc['name'] for tc in repeated)} with these "
+                                            f"exact arguments, the result is above. Use it or try something else.")
+            return {"messages": [feedback], "status": "incomplete", "budget": budget}
+
+    budget["repeated"] = [tc['id'] for tc in repeated]
+    budget["calls"] = record_calls(budget["calls"], [tc for tc in response.tool_calls
+                                                      if tc['id'] not in budget["repeated"]])
+    return {"messages": [response], "budget": budget}
+
+
+@traced_node("worker")
+def worker_node(state: MessagesState) -> dict:
+    return _drive(_worker_steps(state))
+
+
+@traced_node("worker")
+async def aworker_node(state: MessagesState) -> dict:
+    return await _adrive(_worker_steps(state))
+
+
+def _tool_event(writer, event: str, tc: dict, **fields) -> None:
+    """Tool progress for Jarvas.stream (custom stream mode), a no-op when nobody streams."""
+    writer({"event": event, "name": tc['name'], "id": tc['id'], **fields})
+
+
+def _repeated_result(tc: dict) -> str:
+    return f"Not run: you already ran {tc['name']} with these exact arguments, the result is above."
+
+
+def _run_tool_call(tc: dict, started: dict, writer, repeated: set):
+    """Runs a single tool call, records when it actually started (for its timeout). Returns the raw result."""
+    started[tc['id']] = monotonic()
+
+    name = tc['name']
+    if name not in tools_by_name:
+        # Tell the model it made a mistake so it can correct itself
+        return f"Error: Tool '{name}' does not exist. Please use only allowed tools or iterpret yourself."
+    if tc['id'] in repeated:
+        return _repeated_result(tc)
+
+    _tool_event(writer, "tool_start", tc, args=tc['args'])
+    tool = tools_by_name[name]
+    with span("tool", name, args=trace_args(tc['args'])) as record:
+        try:
+            result = tool.invoke(tc['args'])
+        except Exception as e:
+            result = f"Error executing {name}: {e}"
+        record["result_chars"] = len(str(result))
+    _tool_event(writer, "tool_end", tc, seconds=round(monotonic() - started[tc['id']], 3))
+    return result
+
+
+def _collect_tool_result(tc: dict, future, started: dict, queue_deadline: float):
+    """Waits for a tool call, the timeout counts from the moment the call left the queue."""
+    while True:
+        start = started.get(tc['id'])
+        if start is None:
+            # Still queued behind other calls, the clock has not started yet.
+            if monotonic() >= queue_deadline and future.cancel():
+                return f"Error executing {tc['name']}: never started, other tool calls are hanging."
+            wait([future], timeout=0.05)
+        else:
+            wait([future], timeout=max(0.0, start + TOOL_TIMEOUT - monotonic()))
+
+        if future.done():
+            return future.result()
 
-    return {"messages": [response]}
+        if start is not None and monotonic() - start >= TOOL_TIMEOUT:
+            # Threads cannot be killed, the call keeps running but the worker moves on.
+            info(f"tool {tc['name']} timed out after {TOOL_TIMEOUT}s")
+            return f"Error executing {tc['name']}: timed out after {TOOL_TIMEOUT} seconds."
 
 
+def _charge_tools(state: MessagesState, seconds: float) -> dict:
+    """Adds the time of a tool turn to the request budget (calls overlap, the turn counts once)."""
+    budget = open_budget(state)
+    budget["tool_s"] += seconds
+    return budget
+
+
+def _tool_message(tc: dict, result) -> ToolMessage:
+    """The LLM reads the text, the auditor pre-check reads the structured result kept as artifact."""
+    return ToolMessage(content=str(result), tool_call_id=tc['id'], name=tc['name'],
+                       artifact=None if isinstance(result, str) else result)
+
+
+@traced_node("tools")
 def tool_node(state: MessagesState) -> dict:
     """Execute tools."""
     last_msg = state["messages"][-1]
+    tool_calls = getattr(last_msg, 'tool_calls', [])
+
+    debug(f"current tool_call: {tool_calls}")
+
+    if not tool_calls:
+        return {"messages": []}
+
+    # Independent tool calls run side by side, results keep the order of the tool_calls.
+    # The calls the worker repeated are answered without running (see _worker_steps).
+    repeated = set(open_budget(state)["repeated"])
+    writer = get_stream_writer()
+    node_start = monotonic()
+    started = {}
+    queue_deadline = monotonic() + TOOL_TIMEOUT * len(tool_calls)
+    pool = ThreadPoolExecutor(max_workers=min(TOOL_MAX_WORKERS, len(tool_calls)), thread_name_prefix="tool")
+    try:
+        # Each call runs in a copy of the node context, so the tools see the session workspace.
+        futures = [pool.submit(contextvars.copy_context().run, _run_tool_call, tc, started, writer, repeated)
+                   for tc in tool_calls]
+        results = [_tool_message(tc, _collect_tool_result(tc, future, started, queue_deadline))
+                   for tc, future in zip(tool_calls, futures)]
+    finally:
+        # Don't block on calls that timed out.
+        pool.shutdown(wait=False, cancel_futures=True)
 
-    debug(f"current tool_call: {last_msg.tool_calls}")
-    results = []
+    debug(f"tool call results {results}")
+    return {"messages": results, "budget": _charge_tools(state, monotonic() - node_start)}
 
-    for tc in getattr(last_msg, 'tool_calls', []):
-        name = tc['name']
-        if name not in tools_by_name:
-            # Tell the model it made a mistake so it can correct itself
-            obs = f"Error: Tool '{name}' does not exist. Please use only allowed tools or iterpret yourself."
-        else:
-            tool = tools_by_name[name]
+
+async def _arun_tool_call(tc: dict, slots: asyncio.Semaphore, writer, repeated: set):
+    """Async counterpart of _run_tool_call, the timeout starts once the call gets a slot."""
+    name = tc['name']
+    if name not in tools_by_name:
+        return f"Error: Tool '{name}' does not exist. Please use only allowed tools or iterpret yourself."
+    if tc['id'] in repeated:
+        return _repeated_result(tc)
+
+    async with slots:
+        _tool_event(writer, "tool_start", tc, args=tc['args'])
+        start = monotonic()
+        with span("tool", name, args=trace_args(tc['args'])) as record:
             try:
-                obs = tool.invoke(tc['args'])
+                # Sync tools run in the loop executor, with the node context (session workspace).
+                result = await asyncio.wait_for(tools_by_name[name].ainvoke(tc['args']), TOOL_TIMEOUT)
+            except asyncio.TimeoutError:
+                # The executor thread is not killed, run_command stops its subprocess at the same timeout.
+                info(f"tool {name} timed out after {TOOL_TIMEOUT}s")
+                result = f"Error executing {name}: timed out after {TOOL_TIMEOUT} seconds."
             except Exception as e:
-                obs = f"Error executing {name}: {e}"
-        results.append(ToolMessage(content=str(obs), tool_call_id=tc['id']))
+                result = f"Error executing {name}: {e}"
+            record["result_chars"] = len(str(result))
+        _tool_event(writer, "tool_end", tc, seconds=round(monotonic() - start, 3))
+        return result
+
+
+@traced_node("tools")
+async def atool_node(state: MessagesState) -> dict:
+    """Execute tools without blocking the event loop."""
+    last_msg = state["messages"][-1]
+    tool_calls = getattr(last_msg, 'tool_calls', [])
+
+    debug(f"current tool_call: {tool_calls}")
+
+    if not tool_calls:
+        return {"messages": []}
+
+    writer = get_stream_writer()
+    node_start = monotonic()
+    slots = asyncio.Semaphore(TOOL_MAX_WORKERS)
+    repeated = set(open_budget(state)["repeated"])
+    outputs = await asyncio.gather(*(_arun_tool_call(tc, slots, writer, repeated) for tc in tool_calls))
+    results = [_tool_message(tc, output) for tc, output in zip(tool_calls, outputs)]
 
     debug(f"tool call results {results}")
-    return {"messages": results}
+    return {"messages": results, "budget": _charge_tools(state, monotonic() - node_start)}
 
 
 
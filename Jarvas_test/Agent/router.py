@@ -0,0 +1,208 @@
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import info, debug
+from Agent.models import embedding_model
+from setup import ROUTER_THRESHOLD, ROUTER_CACHE_ITEMS
+
+
+# Labeled examples for the nearest-neighbor stage, in the terms of CLASSIFIER_INSTRUCTION.
+EXAMPLES = [
+    ("list the files in the workspace", "perform_action"),
+    ("what files do we have", "perform_action"),
+    ("check what type of file challenge.bin is", "perform_action"),
+    ("extract the strings from the image", "perform_action"),
+    ("look for hidden files inside this picture", "perform_action"),
+    ("run binwalk on the firmware", "perform_action"),
+    ("is there anything embedded in the png", "perform_action"),
+    ("read the metadata of photo.jpg", "perform_action"),
+    ("search the extracted folder for the flag", "perform_action"),
+    ("decode this base64 string", "perform_action"),
+    ("show me the picture", "perform_action"),
+    ("extract the audio stream from the video", "perform_action"),
+    ("try steghide with the password we found", "perform_action"),
+    ("open notes.txt and tell me what it says", "perform_action"),
+    ("update your database", "perform_action"),
+    ("what do you know about me", "perform_action"),
+    ("what is my name", "perform_action"),
+    ("find the flag", "perform_action"),
+    ("what is steganography", "informational"),
+    ("explain how a zip file is structured", "informational"),
+    ("what is the difference between md5 and sha256", "informational"),
+    ("how does lsb steganography work", "informational"),
+    ("what does binwalk do", "informational"),
+    ("hello, how are you", "informational"),
+    ("thanks, that was helpful", "informational"),
+    ("what are magic bytes", "informational"),
+    ("give me tips for a forensics ctf", "informational"),
+    ("why would a file have high entropy", "informational"),
+    ("what is a png chunk", "informational"),
+    ("who are you", "informational"),
+]
+
+# Rule signals.
+PATH_PATTERN = re.compile(r"(?:^|\s)(?:\.{0,2}/\S+|\S+\.(?:png|jpe?g|gif|bmp|bin|zip|gz|tar|7z|rar|pdf|txt|"
+                          r"wav|mp3|mp4|mkv|elf|exe|img|raw|pcap|docx?|xlsx?|db|sqlite))\b", re.IGNORECASE)
+TOOL_WORDS = {"strings", "binwalk", "ls", "ffprobe", "ffmpeg", "display", "grep", "cat", "exiftool", "steghide",
+              "base64", "file"}
+WORKSPACE_WORDS = {"folder", "directory", "dir", "files", "workspace", "image", "picture", "photo", "video", "audio",
+                   "archive", "flag", "here", "this", "these"}
+ACTION_WORDS = {"extract", "run", "check", "scan", "list", "find", "open", "decode", "analyze", "analyse", "show",
+                "read", "search", "carve", "inspect", "look", "update", "display", "dump", "crack", "try"}
+PERSONAL_PATTERN = re.compile(r"\b(?:my name|about me|who am i|remember me|my (?:info|details|profile))\b",
+                              re.IGNORECASE)
+QUESTION_PATTERN = re.compile(r"^\s*(?:what (?:is|are|does)|what's|explain|how (?:does|do|can)|why|define|"
+                              r"tell me about|hi|hello|hey|thanks?|thank you|who are you)\b", re.IGNORECASE)
+
+# Neighbors voting in the nearest-neighbor stage, and the similarity under which their vote is discounted.
+NEIGHBORS = 5
+MIN_SIMILARITY = 0.5
+
+
+@dataclass
+class RouteDecision:
+    message_type: str
+    request: str | None     # None when decided locally, the worker gets the user message itself
+    confidence: float
+    source: str             # rules, neighbors, cache or llm
+
+
+def message_text(message) -> str:
+    """Text of a message, Gemini can return content as a list of parts."""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in message.content)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class IntentRouter:
+
+    """
+    Local routing in front of the MessageClassifier call.
+
+    - rules: paths, tool names and action verbs point to perform_action, bare questions to informational
+    - neighbors: cosine vote of the closest EXAMPLES, with embedding_model (cached embeddings)
+    - cache: decisions (local or from the LLM) for messages already seen
+
+    route() returns None when the confidence is under the threshold, the caller then asks the LLM
+    and hands the answer to remember().
+    """
+
+    def __init__(self, examples=EXAMPLES, threshold: float = ROUTER_THRESHOLD, cache_items: int = ROUTER_CACHE_ITEMS):
+        self.examples = examples
+        self.threshold = threshold
+        self.cache_items = cache_items
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._matrix_lock = threading.Lock()
+
+    # ---------- stages ----------
+
+    @staticmethod
+    def rules(text: str) -> tuple[str, float] | None:
+        words = set(re.findall(r"[a-z0-9]+", text.lower()))
+
+        if PERSONAL_PATTERN.search(text):
+            return "perform_action", 0.9
+
+        action = 0.0
+        if PATH_PATTERN.search(text):
+            action += 0.6
+        if words & TOOL_WORDS:
+            action += 0.25
+        if words & ACTION_WORDS:
+            action += 0.25
+        if words & WORKSPACE_WORDS:
+            action += 0.25
+
+        if QUESTION_PATTERN.search(text):
+            # "what is binwalk" is a question, "what is in secret.png" needs the worker.
+            return ("perform_action", min(action, 0.95)) if action >= 0.6 else ("informational", 0.8 - action)
+        if action:
+            return "perform_action", min(action, 0.95)
+        return None
+
+    def _example_matrix(self):
+        import numpy as np     #numpy is heavy, only imported once a message reaches this stage.
+
+        with self._matrix_lock:
+            if self._matrix is None:
+                vectors = np.asarray(embedding_model.get().embed_documents([text for text, _ in self.examples]),
+                                     dtype=np.float32)
+                self._matrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            return self._matrix
+
+    def neighbors(self, text: str) -> tuple[str, float] | None:
+        import numpy as np
+
+        try:
+            matrix = self._example_matrix()
+            query = np.asarray(embedding_model.get().embed_query(text), dtype=np.float32)
+        except Exception as e:
+            # Ollama down, the LLM classifier still works.
+            info(f"router: embeddings unavailable, {e}")
+            return None
+
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        similarities = matrix @ (query / norm)
+        top = np.argsort(similarities)[::-1][:NEIGHBORS]
+
+        votes = {}
+        for index in top:
+            label = self.examples[index][1]
+            votes[label] = votes.get(label, 0.0) + max(float(similarities[index]), 0.0)
+        total = sum(votes.values())
+        if not total:
+            return None
+
+        label = max(votes, key=votes.get)
+        confidence = votes[label] / total * min(1.0, float(similarities[top[0]]) / MIN_SIMILARITY)
+        return label, confidence
+
+    # ---------- decisions ----------
+
+    def route(self, text: str) -> RouteDecision | None:
+        key = _normalize(text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                cached = self._cache[key]
+                return RouteDecision(cached.message_type, cached.request, cached.confidence, "cache")
+
+        rule = self.rules(text)
+        if rule and rule[1] >= self.threshold:
+            decision = RouteDecision(rule[0], None, rule[1], "rules")
+        else:
+            neighbor = self.neighbors(text)
+            if neighbor is None:
+                decision = RouteDecision(rule[0], None, rule[1], "rules") if rule else None
+            elif rule is None:
+                decision = RouteDecision(neighbor[0], None, neighbor[1], "neighbors")
+            elif rule[0] == neighbor[0]:
+                decision = RouteDecision(rule[0], None, 1 - (1 - rule[1]) * (1 - neighbor[1]), "neighbors")
+            else:
+                strong, weak = (rule, neighbor) if rule[1] >= neighbor[1] else (neighbor, rule)
+                decision = RouteDecision(strong[0], None, strong[1] - weak[1], "neighbors")
+
+        if decision is None or decision.confidence < self.threshold:
+            debug(f"router: unsure ({decision}), asking the classifier")
+            return None
+
+        info(f"router: {decision.message_type} ({decision.source}, {decision.confidence:.2f})")
+        self.remember(text, decision.message_type, decision.request, decision.confidence)
+        return decision
+
+    def remember(self, text: str, message_type: str, request: str = None, confidence: float = 1.0) -> None:
+        """Caches a decision, the LLM classifier answers are stored with confidence 1."""
+        with self._lock:
+            self._cache[_normalize(text)] = RouteDecision(message_type, request, confidence, "cache")
+            self._cache.move_to_end(_normalize(text))
+            while len(self._cache) > self.cache_items:
+                self._cache.popitem(last=False)
@@ -0,0 +1,50 @@
+import threading
+from logging import info
+
+
+class RunnableRegistry:
+
+    """
+    Keeps structured-output and tool-bound runnables between graph steps.
+    Building them serializes the pydantic and tool schemas, so each one is built once and reused.
+    Every entry has a fingerprint (model instance, tools list...). A runnable is rebuilt when its
+    fingerprint changes, or when refresh() is called.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._built = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory, fingerprint=lambda: None) -> None:
+        """
+        :param factory: builds the runnable
+        :param fingerprint: returns a hashable value, the runnable is rebuilt when it changes
+        """
+        with self._lock:
+            self._factories[name] = (factory, fingerprint)
+            self._built.pop(name, None)
+
+    def get(self, name: str):
+        factory, fingerprint = self._factories[name]
+        current = fingerprint()
+
+        built = self._built.get(name)
+        if built is not None and built[0] == current:
+            return built[1]
+
+        with self._lock:
+            built = self._built.get(name)
+            if built is None or built[0] != current:
+                info(f"Building runnable {name}")
+                built = (current, factory())
+                self._built[name] = built
+        return built[1]
+
+    def refresh(self, name: str = None) -> None:
+        """Drops one or all built runnables, they are rebuilt on next use."""
+        with self._lock:
+            if name is None:
+                self._built.clear()
+            else:
+                self._built.pop(name, None)
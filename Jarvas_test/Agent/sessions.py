@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from Utils.workspace import DEFAULT_WORKSPACE
+
+
+current_file_dir = Path(__file__).resolve().parent
+
+# Kept next to the checkpoints of the sessions.
+session_storage_path = current_file_dir.parent / "Documents" / "Sessions" / "sessions.sqlite3"
+
+# Thread id used before sessions existed, it keeps the whole WORKING_DIR as its workspace.
+DEFAULT_SESSION = "1"
+
+# Workspaces of the new sessions, next to WORKING_DIR and not inside it: the default session would
+# otherwise reach the evidence of every other session.
+SESSIONS_ROOT = DEFAULT_WORKSPACE.parent / ".jarvas-sessions"
+
+
+@dataclass
+class Session:
+    session_id: str
+    name: str
+    working_dir: str
+    created: float
+    last_used: float
+    closed: bool = False
+
+
+class SessionStore:
+
+    """
+    Registry of the investigations hosted by one Jarvas process.
+    A session is a LangGraph thread (its id is the thread_id) plus its own working directory.
+    """
+
+    def __init__(self, storage_p=session_storage_path):
+        self._lock = threading.Lock()
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                working_dir TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                closed INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self._conn.commit()
+
+        if self.get(DEFAULT_SESSION) is None:
+            now = time.time()
+            self._insert(Session(DEFAULT_SESSION, "default", str(DEFAULT_WORKSPACE), now, now))
+
+    def _insert(self, session: Session) -> None:
+        with self._lock:
+            self._conn.execute("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                               (session.session_id, session.name, session.working_dir,
+                                session.created, session.last_used, int(session.closed)))
+            self._conn.commit()
+
+    def create(self, name: str = None, working_dir: str = None) -> Session:
+        """
+        :param name: label shown to the analyst
+        :param working_dir: workspace of the session, defaults to a new folder in SESSIONS_ROOT. It may not be
+            inside the workspace of another session, nor hold one.
+        """
+        session_id = uuid.uuid4().hex[:8]
+        workspace = Path(working_dir).resolve() if working_dir else SESSIONS_ROOT / session_id
+        for other in self.list(include_closed=True):
+            other_workspace = Path(other.working_dir)
+            if workspace == other_workspace or other_workspace in workspace.parents or workspace in other_workspace.parents:
+                raise ValueError(f"{workspace} overlaps the workspace of session {other.session_id}.")
+        workspace.mkdir(parents=True, exist_ok=True)
+
+        now = time.time()
+        session = Session(session_id, name or session_id, str(workspace), now, now)
+        self._insert(session)
+        return session
+
+    def get(self, session_id: str) -> Session | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return Session(*row[:5], closed=bool(row[5])) if row else None
+
+    def list(self, include_closed: bool = False) -> list[Session]:
+        query = "SELECT * FROM sessions" + ("" if include_closed else " WHERE closed = 0")
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY last_used DESC").fetchall()
+        return [Session(*row[:5], closed=bool(row[5])) for row in rows]
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (time.time(), session_id))
+            self._conn.commit()
+
+    def set_closed(self, session_id: str, closed: bool) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET closed = ? WHERE session_id = ?", (int(closed), session_id))
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
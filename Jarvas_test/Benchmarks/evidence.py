@@ -0,0 +1,103 @@
+"""
+Synthetic evidence files for the benchmarks. Content is seeded, the same arguments give the same bytes.
+"""
+import io
+import random
+import shutil
+import struct
+import subprocess
+import wave
+import zipfile
+import zlib
+from pathlib import Path
+
+
+BLOCK = 1024 * 1024
+
+
+def write_blob(path: Path, size_mb: int, flag: str, strings_per_mb: int = 64, seed: int = 0) -> dict:
+    """
+    Random bytes with printable strings scattered in them and the flag near the end.
+    Written block by block, multi-GB blobs never sit in memory.
+    """
+    rng = random.Random(seed)
+    flag_block = max(0, size_mb - 1)
+    with open(path, "wb") as f:
+        for index in range(size_mb):
+            block = bytearray(rng.randbytes(BLOCK))
+            for _ in range(strings_per_mb):
+                text = f"/usr/lib/module_{rng.randrange(10 ** 6)}.so".encode()
+                offset = rng.randrange(BLOCK - len(text))
+                block[offset:offset + len(text)] = text
+            if index == flag_block:
+                block[BLOCK // 2:BLOCK // 2 + len(flag)] = flag.encode()
+            f.write(block)
+    return {"path": path, "bytes": size_mb * BLOCK}
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_zip_in_png(path: Path, flag: str, side: int = 256, seed: int = 0) -> dict:
+    """A valid RGB PNG with a zip archive (flag.txt) appended after IEND."""
+    rng = random.Random(seed)
+    rows = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+    png = (b"\x89PNG\r\n\x1a\n"
+           + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+           + _png_chunk(b"IDAT", zlib.compress(rows))
+           + _png_chunk(b"IEND", b""))
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("flag.txt", flag, compress_type=zipfile.ZIP_STORED)     # visible to strings too
+        z.writestr("notes/readme.txt", "nothing to see here\n" * 50)
+
+    path.write_bytes(png + archive.getvalue())
+    return {"path": path, "bytes": path.stat().st_size, "zip_offset": len(png)}
+
+
+def write_media(path: Path, flag: str, seconds: int = 5) -> dict:
+    """
+    Media with an extra stream holding the flag: audio + subtitle track in a Matroska file when ffmpeg
+    is installed, otherwise a WAV with the flag in an extra RIFF chunk.
+    """
+    if shutil.which("ffmpeg"):
+        subtitles = path.with_suffix(".srt")
+        subtitles.write_text(f"1\n00:00:00,000 --> 00:00:0{min(seconds, 9)},000\n{flag}\n")
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                        "-i", str(subtitles), "-map", "0", "-map", "1", "-c:s", "srt", str(path)], check=True)
+        subtitles.unlink()
+        return {"path": path, "bytes": path.stat().st_size, "streams": 2}
+
+    path = path.with_suffix(".wav")
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(bytes(8000 * 2 * seconds))
+    data = flag.encode()
+    with open(path, "r+b") as f:
+        f.seek(0, 2)
+        f.write(b"LIST" + struct.pack("<I", len(data)) + data + (b"\x00" if len(data) % 2 else b""))
+        riff_size = f.tell() - 8
+        f.seek(4)
+        f.write(struct.pack("<I", riff_size))
+    return {"path": path, "bytes": path.stat().st_size, "streams": 1}
+
+
+def write_notes(directory: Path, count: int, seed: int = 0) -> dict:
+    """Text files for the RAG layer, one of them holds the answer the RAG scenario looks for."""
+    rng = random.Random(seed)
+    words = ("png zip header chunk offset entropy binwalk strings exif metadata stream codec flag steghide "
+             "password analyst case evidence sector partition carving magic signature").split()
+    directory.mkdir(parents=True, exist_ok=True)
+    total = 0
+    for index in range(count):
+        paragraphs = ["\n".join(" ".join(rng.choice(words) for _ in range(12)) for _ in range(6)) for _ in range(8)]
+        if index == count // 2:
+            paragraphs.append("The analyst on this case is Dana. Favourite tool: exiftool.")
+        text = "\n\n".join(paragraphs)
+        (directory / f"note_{index:04}.txt").write_text(text)
+        total += len(text)
+    return {"path": directory, "bytes": total, "files": count}
@@ -0,0 +1,101 @@
+"""
+Offline stand-ins for the LLM clients, used by the benchmarks.
+"""
+import re
+import time
+import zlib
+from typing import Callable
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class StubChatModel(BaseChatModel):
+
+    """
+    Chat model that answers instantly with a fixed message.
+    bind_tools converts the tools to JSON schemas like the real integrations do,
+    so building runnables costs the same as with Gemini.
+    """
+
+    reply: str = "ok"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(tool) for tool in tools]
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return super().bind(tools=formatted, **kwargs)
+
+
+class ScriptedChatModel(StubChatModel):
+
+    """
+    Deterministic chat model driven by a script.
+
+    script(messages, schema) returns the answer. schema is the name of the structured output requested
+    (MessageClassifier, ResultValidation) or None, the answer is then a dict of its fields.
+    Otherwise the answer is an AIMessage (text or tool calls).
+    with_structured_output goes through bind_tools and a forced tool call, as with Gemini, so parsing,
+    callbacks and tracing run the real code. latency_s simulates the network round-trip.
+    """
+
+    script: Callable
+    latency_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+        # with_structured_output binds its schema as the only tool and forces the call.
+        tools = kwargs.get("tools") or []
+        schema = tools[0]["function"]["name"] if kwargs.get("tool_choice") and len(tools) == 1 else None
+
+        answer = self.script(messages, schema)
+        if schema:
+            answer = AIMessage(content="", tool_calls=[{"name": schema, "args": answer, "id": f"call_{schema}"}])
+
+        input_tokens, output_tokens = count_tokens_approximately(messages), count_tokens_approximately([answer])
+        answer.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                 "total_tokens": input_tokens + output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=answer)])
+
+
+class HashEmbeddings(Embeddings):
+
+    """
+    Deterministic embeddings: hashed bag of words, normalized.
+    Texts sharing words are close, enough for the router and RAG ranking to behave like with a real model.
+    """
+
+    def __init__(self, dimensions: int = 256, latency_s: float = 0.0):
+        self.dimensions = dimensions
+        self.latency_s = latency_s
+
+    def _vector(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dimensions] += 1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the per-step overhead removed by the runnable registry (Agent/nodes.py RUNNABLES).
+
+Compares building the classifier, auditor and tool-bound worker runnables on every graph step
+(what the nodes used to do) with fetching them from the registry. Models are stubbed, nothing
+leaves the machine. Run from Jarvas_test:
+
+    python -m Benchmarks.runnables --steps 200
+"""
+import argparse
+from time import perf_counter
+from Benchmarks.fakes import StubChatModel
+from Agent.models import gemini_model, worker_gemini_model
+from Agent.nodes import RUNNABLES, MessageClassifier, ResultValidation, refresh_runnables
+from Utils.tools import TOOLS
+
+
+def build_every_step():
+    gemini_model.get().with_structured_output(MessageClassifier)
+    gemini_model.get().with_structured_output(ResultValidation)
+    worker_gemini_model.get().bind_tools(TOOLS)
+
+
+def from_registry():
+    RUNNABLES.get("classifier")
+    RUNNABLES.get("auditor")
+    RUNNABLES.get("worker")
+
+
+def measure(step, steps: int) -> float:
+    """Mean seconds per graph step."""
+    step()      # warm up
+    start = perf_counter()
+    for _ in range(steps):
+        step()
+    return (perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+
+    gemini_model.override(StubChatModel())
+    worker_gemini_model.override(StubChatModel())
+    refresh_runnables()
+
+    rebuilt = measure(build_every_step, args.steps)
+    cached = measure(from_registry, args.steps)
+
+    print(f"tools bound: {len(TOOLS)}, steps: {args.steps}")
+    print(f"rebuild every step: {rebuilt * 1000:8.3f} ms/step")
+    print(f"registry:           {cached * 1000:8.3f} ms/step")
+    print(f"saved:              {(rebuilt - cached) * 1000:8.3f} ms/step ({rebuilt / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+End-to-end benchmark: scripted LLMs, synthetic evidence, the real graph, tools, checkpointer and RAG.
+
+gemini_model, worker_gemini_model and embedding_model are replaced by deterministic stand-ins
+(Benchmarks/fakes.py), everything else is the code Jarvas runs. Each scenario is a fresh thread
+through make_agent(); the first iteration runs with cold caches, the next ones warm.
+Everything is written to a temporary directory. Run from Jarvas_test:
+
+    python -m Benchmarks.scenarios --iterations 3 --size-mb 64
+    python -m Benchmarks.scenarios --json after.json --baseline before.json
+
+Tool throughput (evidence MB/s, RAG chunks/s) is measured on the cold iteration, warm ones hit the tool cache.
+"""
+import argparse
+import json
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from Benchmarks.evidence import write_blob, write_zip_in_png, write_media, write_notes
+from Benchmarks.fakes import ScriptedChatModel, HashEmbeddings
+
+
+FLAG = "picoCTF{b3nchm4rk_" + "0" * 8 + "}"
+
+
+@dataclass
+class Scenario:
+    name: str
+    message: str
+    message_type: str                       # what the classifier answers
+    plan: list = field(default_factory=list)   # tool calls of each worker turn
+    expect: str = FLAG                      # text the final answer must contain
+    evidence_bytes: int = 0
+
+
+def build_scenarios(workspace: Path, notes: Path, size_mb: int) -> list[Scenario]:
+    blob = write_blob(workspace / "evidence.bin", size_mb, FLAG)
+    png = write_zip_in_png(workspace / "image.png", FLAG)
+    media = write_media(workspace / "capture.mkv", FLAG)
+    write_notes(notes, 200)
+    media_name = media["path"].name
+
+    return [
+        Scenario("strings-blob", "find the flag in evidence.bin", "perform_action",
+                 plan=[[("file", {"file_path": "evidence.bin"})],
+                       [("strings", {"file_path": "evidence.bin", "min_length": 8, "pattern": "picoCTF"})]],
+                 evidence_bytes=blob["bytes"]),
+        Scenario("zip-in-png", "look for hidden files inside image.png", "perform_action",
+                 plan=[[("file", {"file_path": "image.png"}), ("exiftool", {"file_path": "image.png"})],
+                       [("binwalk", {"file_path": "image.png"})],
+                       [("strings", {"file_path": "image.png", "pattern": "picoCTF"})]],
+                 evidence_bytes=png["bytes"]),
+        Scenario("media-streams", f"check {media_name} for extra streams", "perform_action",
+                 plan=[[("ffprobe_check", {"file_path": media_name})],
+                       [("strings", {"file_path": media_name, "pattern": "picoCTF"})]],
+                 evidence_bytes=media["bytes"]),
+        Scenario("rag", "update your database and tell me who the analyst on this case is", "perform_action",
+                 plan=[[("update_data", {})],
+                       [("retrieve_data", {"query": "favourite tool"})]],
+                 expect="Dana"),
+        Scenario("informational", "what is steganography", "informational", expect="Steganography"),
+    ]
+
+
+#-------SCRIPTED MODELS-------
+
+class Script:
+
+    """Answers of the scripted models for the scenario being run."""
+
+    scenario: Scenario = None
+
+    def supervisor(self, messages, schema):
+        if schema == "MessageClassifier":
+            return {"message_type": self.scenario.message_type, "request": self.scenario.message}
+        if schema == "ResultValidation":
+            outputs = " ".join(str(m.content) for m in messages if isinstance(m, ToolMessage))
+            if self.scenario.expect in outputs:
+                return {"status": "complete", "notes": f"Found {self.scenario.expect}."}
+            return {"status": "incomplete", "notes": "Nothing conclusive yet, continue with the next step."}
+        return AIMessage(content="Steganography hides data inside other data, like pixels or audio samples.")
+
+    def worker(self, messages, schema):
+        turn = sum(1 for m in messages if isinstance(m, AIMessage) and m.tool_calls)
+        if turn < len(self.scenario.plan):
+            calls = [{"name": name, "args": args, "id": f"call_{turn}_{index}"}
+                     for index, (name, args) in enumerate(self.scenario.plan[turn])]
+            return AIMessage(content="", tool_calls=calls)
+        return AIMessage(content="I could not find more.")
+
+
+#-------MEASURES-------
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def step_table(spans: list[dict]) -> dict:
+    """Latency of every node, LLM and tool span, by name."""
+    durations = defaultdict(list)
+    for record in spans:
+        if record["kind"] in ("node", "llm", "tool"):
+            durations[f"{record['kind']}:{record['name']}"].append(record["duration_s"])
+    return {name: {"count": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+                   "p95_ms": percentile(values, 0.95) * 1000, "total_s": sum(values)}
+            for name, values in sorted(durations.items())}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(args) -> dict:
+    root = Path(tempfile.mkdtemp(prefix="jarvas-bench-"))
+    workspace, notes = root / "workspace", root / "notes"
+    workspace.mkdir()
+
+    # Everything persistent goes to root, nothing touches Documents/.
+    import Utils.cache
+    import Utils.tracing
+    from Agent.checkpointer import DeltaSqliteSaver
+    from Agent.embeddings import CachedEmbeddings
+    from Agent.graph import make_agent
+    from Agent.models import gemini_model, worker_gemini_model, embedding_model
+    from Agent.nodes import refresh_runnables
+    from Utils.documents import ChromaDB
+    from Utils.tools import GLOBAL_DB
+    from Utils.tracing import LLM_TRACER, span, load_spans
+    from Utils.workspace import use_workspace
+
+    script = Script()
+    gemini_model.override(ScriptedChatModel(script=script.supervisor, latency_s=args.llm_latency))
+    worker_gemini_model.override(ScriptedChatModel(script=script.worker, latency_s=args.llm_latency))
+    embedding_model.override(CachedEmbeddings(HashEmbeddings(latency_s=args.embed_latency), "bench-hash",
+                                              storage_p=root / "embeddings.sqlite3"))
+    refresh_runnables()
+    Utils.cache.TOOL_CACHE.override(Utils.cache.ToolCache(root / "tool_cache.sqlite3"))
+    Utils.tracing.trace_storage_path = root / "traces"
+    GLOBAL_DB.override(ChromaDB(storage_p=str(root / "chroma"), documents_p=notes))
+
+    started = time.perf_counter()
+    scenarios = build_scenarios(workspace, notes, args.size_mb)
+    print(f"evidence generated in {time.perf_counter() - started:.1f}s under {root}")
+
+    agent = make_agent(checkpointer=DeltaSqliteSaver(root / "checkpoints.sqlite3"))
+    results = {}
+    for scenario in scenarios:
+        if args.only and scenario.name not in args.only:
+            continue
+        script.scenario = scenario
+        walls, answers, traces, chunks = [], [], [], 0
+        if args.tracemalloc:
+            tracemalloc.start()
+        for iteration in range(args.iterations):
+            thread = f"{scenario.name}-{iteration}"
+            config = {"configurable": {"thread_id": thread}, "callbacks": [LLM_TRACER]}
+            start = time.perf_counter()
+            with use_workspace(workspace), span("request", "request", session=scenario.name) as request:
+                state = agent.invoke({"messages": [HumanMessage(content=scenario.message)]}, config)
+            walls.append(time.perf_counter() - start)
+            answers.append(str(state["messages"][-1].content))
+            traces.append(request.get("trace"))
+            if iteration == 0:
+                chunks = sum(m.artifact.get("chunks_added", 0) for m in state["messages"]
+                             if isinstance(m, ToolMessage) and isinstance(m.artifact, dict))
+        traced_peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if args.tracemalloc else None
+        tracemalloc.stop()
+
+        spans = load_spans(scenario.name)
+        cold_tool_s = sum(r["duration_s"] for r in spans if r["kind"] == "tool" and r["trace"] == traces[0])
+        results[scenario.name] = {
+            "ok": all(scenario.expect in answer for answer in answers),
+            "cold_s": walls[0],
+            "warm_s": statistics.median(walls[1:]) if len(walls) > 1 else None,
+            "llm_calls": sum(1 for r in spans if r["kind"] == "llm") / args.iterations,
+            "tool_calls": sum(1 for r in spans if r["kind"] == "tool") / args.iterations,
+            "evidence_mb_s": (scenario.evidence_bytes / 2 ** 20 / cold_tool_s
+                              if scenario.evidence_bytes and cold_tool_s else None),
+            "rag_chunks_s": chunks / cold_tool_s if chunks and cold_tool_s else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "tracemalloc_peak_mb": traced_peak,
+            "steps": step_table(spans),
+        }
+
+    if not args.keep:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+#-------REPORT-------
+
+def report(results: dict, baseline: dict = None) -> None:
+    def delta(name, key):
+        before = (baseline or {}).get(name, {}).get(key)
+        now = results[name][key]
+        if not before or now is None:
+            return ""
+        return f" ({(now - before) / before:+.0%})"
+
+    def number(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"\n{'scenario':<16}{'ok':>4}{'cold s':>10}{'warm s':>10}{'llm':>6}{'tools':>7}"
+          f"{'MB/s':>9}{'chunks/s':>10}{'rss MB':>8}{'heap MB':>9}")
+    for name, result in results.items():
+        print(f"{name:<16}{'yes' if result['ok'] else 'NO':>4}{result['cold_s']:>10.3f}{number(result['warm_s'], '.3f'):>10}"
+              f"{result['llm_calls']:>6.0f}{result['tool_calls']:>7.0f}{number(result['evidence_mb_s'], '.0f'):>9}"
+              f"{number(result['rag_chunks_s'], '.0f'):>10}{result['peak_rss_mb']:>8.0f}"
+              f"{number(result['tracemalloc_peak_mb'], '.1f'):>9}{delta(name, 'cold_s')}{delta(name, 'warm_s')}")
+
+    print(f"\n{'step':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}")
+    merged = defaultdict(lambda: {"count": 0, "p50_ms": [], "p95_ms": [], "total_s": 0.0})
+    for result in results.values():
+        for step, stats in result["steps"].items():
+            merged[step]["count"] += stats["count"]
+            merged[step]["total_s"] += stats["total_s"]
+            merged[step]["p50_ms"].append(stats["p50_ms"])
+            merged[step]["p95_ms"].append(stats["p95_ms"])
+    for step, stats in sorted(merged.items(), key=lambda item: -item[1]["total_s"]):
+        print(f"{step:<28}{stats['count']:>7}{statistics.median(stats['p50_ms']):>10.2f}"
+              f"{max(stats['p95_ms']):>10.2f}{stats['total_s']:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=3, help="runs of each scenario, the first one is cold")
+    parser.add_argument("--size-mb", type=int, default=64, help="size of the large evidence blob")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds added to every scripted LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds added to every embedding request")
+    parser.add_argument("--only", nargs="*", help="scenarios to run")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of a previous run, to print the differences")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary directory")
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    report(results, baseline)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
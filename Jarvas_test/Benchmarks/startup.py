@@ -0,0 +1,62 @@
+"""
+Startup benchmark: time from interpreter start until the REPL is ready (Jarvas() built).
+
+Every run happens in a fresh interpreter so module caches don't hide import costs.
+Run from Jarvas_test:
+
+    python -m Benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that should not be imported before they are needed.
+HEAVY_MODULES = ["langchain_google_genai", "langchain_ollama", "langchain_chroma", "chromadb", "numpy"]
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+from Agent.graph import Jarvas
+imported = time.perf_counter()
+Jarvas()
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - start,
+    "init_s": ready - imported,
+    "ready_s": ready - start,
+    "heavy_loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+}}))
+"""
+
+
+def run_once() -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"{'':>10} {'median':>9} {'min':>9} {'max':>9}")
+    for key in ("import_s", "init_s", "ready_s"):
+        values = [run[key] for run in runs]
+        print(f"{key:>10} {statistics.median(values):>8.3f}s {min(values):>8.3f}s {max(values):>8.3f}s")
+
+    loaded = sorted({m for run in runs for m in run["heavy_loaded"]})
+    print(f"heavy modules loaded before first prompt: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
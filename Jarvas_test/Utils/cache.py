@@ -0,0 +1,220 @@
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from logging import info, debug
+from pathlib import Path
+from setup import TOOL_CACHE_MB
+from Utils.lazy import LazyObject
+
+
+current_file_dir = Path(__file__).resolve().parent
+
+# Tool results are stored next to the RAG database.
+cache_storage_path = current_file_dir.parent / "Documents" / "Cache" / "tool_cache.sqlite3"
+
+# Text of the results handle_tool_errors and the tools return on failure.
+FAILURE_PREFIXES = ("Error", "An unexpected error occurred")
+
+# Failures seen while a cached tool runs: commands that failed or were killed (run_command), cached tools it
+# called that raised. Its result is then returned but not stored. A list shared with the copied contexts of
+# the threads the tool starts.
+_failures = ContextVar("tool_failures", default=None)
+
+
+def _record(failures: list | None, reason: str) -> None:
+    if failures is not None:
+        failures.append(reason)
+
+
+def mark_failure(reason: str) -> None:
+    """Keeps the result of the running cached tool, if any, out of the cache."""
+    _record(_failures.get(), reason)
+
+
+def _failed(value) -> str | None:
+    """Reason when a tool result reports a failure itself."""
+    text = value.get("terminal") if isinstance(value, dict) else value
+    if isinstance(value, dict) and value.get("status") == "Error":
+        return "status Error"
+    if isinstance(text, str) and text.startswith(FAILURE_PREFIXES):
+        return text.splitlines()[0][:200]
+    return None
+
+
+class ToolCache:
+
+    """
+    On-disk cache for tool results.
+    Results are keyed on the tool name, the normalized arguments and the sha256 of the target file,
+    so an unchanged file never runs the same command twice. Least recently used results are evicted
+    once the cache grows over max_bytes.
+    """
+
+    def __init__(self, storage_p=cache_storage_path, max_bytes=TOOL_CACHE_MB * 1024 * 1024):
+        self.storage = Path(storage_p)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.storage.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.storage), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used);
+            CREATE TABLE IF NOT EXISTS digests (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def file_digest(self, path: str) -> str:
+        """
+        sha256 of the file content. The (path, size, mtime) triple is remembered,
+        so a large file is only hashed again when it actually changes.
+        """
+        stat = os.stat(path)
+
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, digest FROM digests WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                               (path, stat.st_size, stat.st_mtime_ns, digest))
+            self._conn.commit()
+        return digest
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: dict, digest: str) -> str:
+        normalized = json.dumps(arguments, sort_keys=True, default=str)
+        return hashlib.sha256(f"{tool_name}\0{normalized}\0{digest}".encode()).hexdigest()
+
+    def get(self, key: str):
+        """Returns (hit, value)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return True, json.loads(row[0])
+
+    def put(self, key: str, tool_name: str, value) -> None:
+        serialized = json.dumps(value, default=str)
+        size = len(serialized.encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                               (key, tool_name, serialized, size, time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drops least recently used results until the cache fits max_bytes. Caller holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+            self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("DELETE FROM digests")
+            self._conn.commit()
+
+
+# Opened on the first cached call, importing the tools does not touch the disk.
+TOOL_CACHE = LazyObject(ToolCache)
+
+
+def cached_tool(tool_name: str, resolve, path_arg: str = "file_path", bypass=None):
+    """
+    Decorator that serves a tool from TOOL_CACHE.
+
+    :param tool_name: name used in the cache key
+    :param resolve: turns the path argument into an absolute path (validate_path)
+    :param path_arg: argument holding the target file
+    :param bypass: predicate over the call arguments, True for side-effecting calls (extract modes)
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+
+            if bypass and bypass(arguments):
+                return func(*args, **kwargs)
+
+            path = resolve(arguments[path_arg])
+            if not os.path.isfile(path):
+                return func(*args, **kwargs)
+
+            arguments[path_arg] = path
+            cache = TOOL_CACHE.get()
+            key = ToolCache.make_key(tool_name, arguments, cache.file_digest(path))
+
+            hit, value = cache.get(key)
+            if hit:
+                info(f"{tool_name} served from cache for {path}")
+                return value
+
+            outer, failures = _failures.get(), []
+            token = _failures.set(failures)
+            try:
+                value = func(*args, **kwargs)
+            except Exception as e:
+                _record(outer, f"{tool_name} raised {e!r}")
+                raise
+            finally:
+                _failures.reset(token)
+
+            # Only complete, successful results are stored, a failure may not happen again (binary installed,
+            # larger timeout) while the file stays the same.
+            reason = failures[0] if failures else _failed(value)
+            if reason:
+                _record(outer, reason)
+                info(f"{tool_name} result not cached for {path}: {reason}")
+                return value
+
+            if isinstance(value, dict) and value.get("output_handle"):
+                # The spilled output it points to is pruned in time and belongs to this workspace only.
+                debug(f"{tool_name} result not cached for {path}: truncated output")
+                return value
+
+            cache.put(key, tool_name, value)
+            debug(f"{tool_name} result cached for {path}")
+            return value
+
+        return wrapper
+    return decorator
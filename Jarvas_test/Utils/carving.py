@@ -0,0 +1,446 @@
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Callable
+import numpy as np
+
+
+CHUNK_SIZE = 16 * 1024 * 1024       # bytes matched per vectorized pass
+CHECK_WINDOW = 1100                 # bytes after a magic its check may read (PE header at e_lfanew <= 1024)
+LENGTH_WINDOW = 256 * 1024 * 1024   # how far a length estimator may search for an end marker
+MAX_WALK = 200_000                  # chunks, segments or boxes followed by a length estimator
+MAX_HITS = 2000
+HEAD_SIZE = 2048                    # bytes identify() needs: the largest magic offset plus CHECK_WINDOW
+
+
+def _u16be(buf, at): return struct.unpack_from(">H", buf, at)[0]
+def _u32be(buf, at): return struct.unpack_from(">I", buf, at)[0]
+def _u16le(buf, at): return struct.unpack_from("<H", buf, at)[0]
+def _u32le(buf, at): return struct.unpack_from("<I", buf, at)[0]
+def _u64le(buf, at): return struct.unpack_from("<Q", buf, at)[0]
+
+
+#-------CHECKS (reject magics that appear by chance)-------
+
+def _jpeg_check(buf, pos):
+    marker = buf[pos + 3:pos + 4]
+    if marker == b"\xe0":
+        return buf[pos + 6:pos + 11] == b"JFIF\x00"
+    if marker == b"\xe1":
+        return buf[pos + 6:pos + 10] in (b"Exif", b"http")
+    if not marker or not (0xe2 <= marker[0] <= 0xef or marker[0] in (0xdb, 0xfe, 0xc0, 0xc4)) or len(buf) < pos + 6:
+        return False
+    following = pos + 4 + _u16be(buf, pos + 4)       # the next segment starts with a marker
+    return buf[following:following + 1] == b"\xff"
+
+
+def _id3_check(buf, pos):
+    header = buf[pos + 3:pos + 10]
+    return len(header) == 7 and header[0] in (2, 3, 4) and header[1] == 0 and header[2] & 0x0f == 0 \
+        and all(c < 0x80 for c in header[3:])
+
+
+def _gzip_check(buf, pos):
+    # Reserved flag bits are zero, extra flags and OS take a few known values.
+    header = buf[pos + 3:pos + 10]
+    return len(header) == 7 and header[0] < 0x20 and header[5] in (0, 2, 4) and (header[6] <= 13 or header[6] == 255)
+
+
+def _bzip2_check(buf, pos):
+    return buf[pos + 3:pos + 4] in (b"1", b"2", b"3", b"4", b"5", b"6", b"7", b"8", b"9") and \
+        buf[pos + 4:pos + 10] in (b"1AY&SY", b"\x17rE8P\x90")
+
+
+def _elf_check(buf, pos):
+    return buf[pos + 4:pos + 5] in (b"\x01", b"\x02") and buf[pos + 5:pos + 6] in (b"\x01", b"\x02") \
+        and buf[pos + 6:pos + 7] == b"\x01"
+
+
+def _pe_check(buf, pos):
+    if len(buf) < pos + 0x40:
+        return False
+    lfanew = _u32le(buf, pos + 0x3c)
+    return 0x40 <= lfanew <= 1024 and buf[pos + lfanew:pos + lfanew + 4] == b"PE\x00\x00"
+
+
+def _riff_check(form):
+    return lambda buf, pos: buf[pos + 8:pos + 12] == form
+
+
+def _ftyp_check(buf, pos):
+    if pos < 0 or len(buf) < pos + 12:
+        return False
+    brand = buf[pos + 8:pos + 12]
+    return 8 <= _u32be(buf, pos) <= 1024 and all(c == 32 or 48 <= c <= 57 or 65 <= c <= 90 or 97 <= c <= 122
+                                                for c in brand)
+
+
+def _tar_check(buf, pos):
+    return buf[pos + 262:pos + 265] in (b"\x0000", b"  \x00")
+
+
+#-------LENGTH ESTIMATORS (bytes from the start of the file, None when unknown)-------
+
+def _png_length(buf, pos, size):
+    p = pos + 8
+    for _ in range(MAX_WALK):
+        if p + 8 > size:
+            return None
+        length, kind = _u32be(buf, p), bytes(buf[p + 4:p + 8])
+        if not kind.isalpha():
+            return None
+        p += 12 + length
+        if kind == b"IEND":
+            return p - pos if p <= size else None
+    return None
+
+
+def _jpeg_length(buf, pos, size):
+    # Marker segments up to the start of scan, the end marker can't appear in the entropy-coded data after it.
+    p = pos + 2
+    for _ in range(MAX_WALK):
+        if p + 4 > size or buf[p] != 0xff:
+            return None
+        marker = buf[p + 1]
+        if marker == 0xd9:
+            return p + 2 - pos
+        if 0xd0 <= marker <= 0xd7 or marker == 0x01:
+            p += 2
+            continue
+        p += 2 + _u16be(buf, p + 2)
+        if marker == 0xda:
+            end = buf.find(b"\xff\xd9", p, min(size, p + LENGTH_WINDOW))
+            return end + 2 - pos if end >= 0 else None
+    return None
+
+
+def _zip_length(buf, pos, size):
+    # The end of central directory record whose directory ends right before it, inner archives have their own.
+    p = pos
+    limit = min(size, pos + LENGTH_WINDOW)
+    while True:
+        eocd = buf.find(b"PK\x05\x06", p, limit)
+        if eocd < 0 or eocd + 22 > size:
+            return None
+        directory_size, directory_offset = _u32le(buf, eocd + 12), _u32le(buf, eocd + 16)
+        if pos + directory_offset + directory_size == eocd:
+            return eocd + 22 + _u16le(buf, eocd + 20) - pos
+        p = eocd + 4
+
+
+def _gzip_length(buf, pos, size):
+    stream = zlib.decompressobj(31)
+    p, limit = pos, min(size, pos + LENGTH_WINDOW)
+    try:
+        while p < limit and not stream.eof:
+            block = bytes(buf[p:min(p + 1024 * 1024, limit)])
+            stream.decompress(block, 1024 * 1024)   # output is thrown away, bounded per call
+            while stream.unconsumed_tail and not stream.eof:
+                stream.decompress(stream.unconsumed_tail, 1024 * 1024)
+            p += len(block)
+    except zlib.error:
+        return None
+    return p - len(stream.unused_data) - pos if stream.eof else None
+
+
+def _7z_length(buf, pos, size):
+    return 32 + _u64le(buf, pos + 12) + _u64le(buf, pos + 20) if pos + 32 <= size else None
+
+
+def _elf_length(buf, pos, size):
+    is64, order = buf[pos + 4] == 2, "<" if buf[pos + 5] == 1 else ">"
+    if is64:
+        shoff, = struct.unpack_from(order + "Q", buf, pos + 0x28)
+        shentsize, shnum = struct.unpack_from(order + "HH", buf, pos + 0x3a)
+    else:
+        shoff, = struct.unpack_from(order + "I", buf, pos + 0x20)
+        shentsize, shnum = struct.unpack_from(order + "HH", buf, pos + 0x2e)
+    return shoff + shentsize * shnum if shoff and shnum else None
+
+
+def _pe_length(buf, pos, size):
+    # End of the furthest section on disk, overlays appended after it are not counted.
+    header = pos + _u32le(buf, pos + 0x3c)
+    sections, optional_size = _u16le(buf, header + 6), _u16le(buf, header + 20)
+    table = header + 24 + optional_size
+    end = 0
+    for index in range(min(sections, 96)):
+        entry = table + 40 * index
+        if entry + 40 > size:
+            return None
+        end = max(end, _u32le(buf, entry + 20) + _u32le(buf, entry + 16))
+    return end or None
+
+
+def _sqlite_length(buf, pos, size):
+    page_size, pages = _u16be(buf, pos + 16), _u32be(buf, pos + 28)
+    return (65536 if page_size == 1 else page_size) * pages or None
+
+
+def _riff_length(buf, pos, size):
+    length = _u32le(buf, pos + 4)
+    return 8 + length + (length & 1)
+
+
+def _mp4_length(buf, pos, size):
+    p = pos
+    for _ in range(MAX_WALK):
+        if p + 8 > size:
+            break
+        box, kind = _u32be(buf, p), bytes(buf[p + 4:p + 8])
+        if not all(c == 32 or 48 <= c <= 57 or 65 <= c <= 90 or 97 <= c <= 122 or c == 169 for c in kind):
+            break
+        if box == 1:
+            box = struct.unpack_from(">Q", buf, p + 8)[0]
+        elif box == 0:
+            box = size - p
+        if box < 8:
+            break
+        p += box
+    return min(p, size) - pos if p > pos else None
+
+
+def _ogg_length(buf, pos, size):
+    p = pos
+    for _ in range(MAX_WALK):
+        if p + 27 > size or buf[p:p + 4] != b"OggS":
+            return p - pos if p > pos else None
+        segments = buf[p + 26]
+        last_page = buf[p + 5] & 0x04
+        p += 27 + segments + sum(buf[p + 27:p + 27 + segments])
+        if last_page:
+            return min(p, size) - pos
+    return None
+
+
+def _tar_length(buf, pos, size):
+    p = pos
+    for _ in range(MAX_WALK):
+        if p + 512 > size:
+            return None
+        if not any(buf[p:p + 512]):            # two zero blocks close the archive
+            return p + 1024 - pos
+        try:
+            length = int(bytes(buf[p + 124:p + 136]).strip(b" \x00") or b"0", 8)
+        except ValueError:
+            return None
+        p += 512 + (length + 511) // 512 * 512
+    return None
+
+
+def _pdf_length(buf, pos, size):
+    end = buf.find(b"%%EOF", pos, min(size, pos + LENGTH_WINDOW))     # the first revision, updates may follow
+    return end + 5 - pos if end >= 0 else None
+
+
+#-------SIGNATURE TABLE-------
+
+@dataclass(frozen=True)
+class Signature:
+    name: str
+    magic: bytes
+    description: str
+    offset: int = 0                 # position of the magic from the start of the file (tar: 257)
+    container: bool = False         # may hold other files
+    check: Callable = None          # check(buf, start) -> bool, start is the start of the file
+    length: Callable = None         # length(buf, start, size) -> int | None
+
+
+SIGNATURES = [
+    Signature("png", b"\x89PNG\r\n\x1a\n", "PNG image", length=_png_length),
+    Signature("jpeg", b"\xff\xd8\xff", "JPEG image", check=_jpeg_check, length=_jpeg_length),
+    Signature("gif", b"GIF87a", "GIF image"),
+    Signature("gif", b"GIF89a", "GIF image"),
+    Signature("webp", b"RIFF", "WebP image", check=_riff_check(b"WEBP"), length=_riff_length),
+    Signature("wav", b"RIFF", "WAV audio", check=_riff_check(b"WAVE"), length=_riff_length),
+    Signature("avi", b"RIFF", "AVI video", check=_riff_check(b"AVI "), length=_riff_length, container=True),
+    Signature("mp4", b"ftyp", "MP4/QuickTime media", offset=4, check=_ftyp_check, length=_mp4_length,
+              container=True),
+    Signature("mkv", b"\x1a\x45\xdf\xa3", "Matroska/WebM media", container=True),
+    Signature("ogg", b"OggS\x00", "Ogg media", length=_ogg_length),
+    Signature("flac", b"fLaC\x00\x00\x00\x22", "FLAC audio"),
+    Signature("mp3", b"ID3", "MP3 audio (ID3 tag)", check=_id3_check),
+    Signature("pdf", b"%PDF-", "PDF document", length=_pdf_length, container=True),
+    Signature("zip", b"PK\x03\x04", "ZIP archive (also docx, xlsx, jar, apk)", length=_zip_length, container=True),
+    Signature("rar", b"Rar!\x1a\x07", "RAR archive", container=True),
+    Signature("7z", b"7z\xbc\xaf\x27\x1c", "7-Zip archive", length=_7z_length, container=True),
+    Signature("gzip", b"\x1f\x8b\x08", "gzip compressed data", check=_gzip_check, length=_gzip_length,
+              container=True),
+    Signature("bzip2", b"BZh", "bzip2 compressed data", check=_bzip2_check, container=True),
+    Signature("xz", b"\xfd7zXZ\x00", "xz compressed data", container=True),
+    Signature("tar", b"ustar", "tar archive", offset=257, check=_tar_check, length=_tar_length, container=True),
+    Signature("elf", b"\x7fELF", "ELF executable", check=_elf_check, length=_elf_length),
+    Signature("pe", b"MZ", "PE executable (Windows)", check=_pe_check, length=_pe_length),
+    Signature("sqlite", b"SQLite format 3\x00", "SQLite database", length=_sqlite_length),
+    Signature("bmp", b"BM", "BMP image",
+              check=lambda buf, pos: buf[pos + 6:pos + 10] == b"\x00\x00\x00\x00" and buf[pos + 14:pos + 15] in
+              (b"\x0c", b"\x28", b"\x38", b"\x40", b"\x6c", b"\x7c"),
+              length=lambda buf, pos, size: _u32le(buf, pos + 2)),
+]
+
+
+@dataclass
+class Hit:
+    offset: int
+    name: str
+    description: str
+    length: int | None = None       # likely size of the embedded file
+    depth: int = 0                  # containers around it
+    parent: int | None = None       # offset of the innermost container around it
+    parts: int = 0                  # magics of the same format inside it (zip entries, ogg pages, tar headers)
+
+    @property
+    def end(self) -> int | None:
+        return self.offset + self.length if self.length else None
+
+
+class SignatureScanner:
+
+    """
+    Finds every magic of the table in one pass.
+
+    Prefilter: the first two bytes of each magic index a 65536 entry table, the buffer is read as
+    little-endian uint16 at even and odd offsets (no copy) and looked up in it, so a chunk costs two
+    vectorized lookups. Only the candidates left are compared with the full magic and checked in Python.
+
+    scan() works on a buffer holding the whole file (mmap), feed() on a stream of blocks.
+    """
+
+    def __init__(self, signatures: list[Signature] = None):
+        self.signatures = signatures or SIGNATURES
+        self._by_prefix = {}
+        self._table = np.zeros(65536, dtype=bool)
+        for signature in self.signatures:
+            key = signature.magic[0] | signature.magic[1] << 8
+            self._table[key] = True
+            self._by_prefix.setdefault(signature.magic[:2], []).append(signature)
+        self._lookahead = max(len(s.magic) for s in self.signatures) + CHECK_WINDOW
+        self._behind = max(s.offset for s in self.signatures)     # bytes a file may start before its magic
+
+        # feed() state: unscanned tail of the stream, and bytes kept before it for the checks
+        self._carry = b""
+        self._base = 0              # stream offset of _carry[0]
+        self._first = 0             # first position of _carry not scanned yet
+
+    def _candidates(self, view, start: int, stop: int) -> np.ndarray:
+        """Positions in [start, stop) where a magic prefix starts, view must reach stop + 1."""
+        segment = view[start:min(stop + 1, len(view))]
+        length = len(segment)
+        even = np.frombuffer(segment[:length - length % 2], dtype="<u2")
+        odd = np.frombuffer(segment[1:1 + (length - 1) // 2 * 2], dtype="<u2")
+        positions = np.concatenate((np.flatnonzero(self._table[even]) * 2,
+                                    np.flatnonzero(self._table[odd]) * 2 + 1))
+        positions.sort()
+        return positions[positions < stop - start] + start
+
+    def _match(self, buf, pos: int) -> list[tuple[int, Signature]]:
+        found = []
+        for signature in self._by_prefix.get(bytes(buf[pos:pos + 2]), ()):
+            start = pos - signature.offset
+            if start < 0 or buf[pos:pos + len(signature.magic)] != signature.magic:
+                continue
+            if signature.check is None or signature.check(buf, start):
+                found.append((start, signature))
+        return found
+
+    def scan(self, buf, start: int = 0, end: int = None) -> list[tuple[int, Signature]]:
+        """Signatures whose magic starts in buf[start:end], with the start of their file."""
+        view = memoryview(buf)
+        end = len(view) if end is None else end
+        found = []
+        try:
+            for chunk in range(start, end, CHUNK_SIZE):
+                for pos in self._candidates(view, chunk, min(chunk + CHUNK_SIZE, end)).tolist():
+                    found += self._match(buf, pos)
+        finally:
+            view.release()
+        return found
+
+    def feed(self, block: bytes) -> list[tuple[int, Signature]]:
+        """
+        Signatures found in the next block of a stream, offsets from the start of the stream.
+        The end of each block is held back until the next one, so magics and checks never miss
+        bytes at a block boundary. Call finish() after the last block.
+        """
+        buffer = self._carry + bytes(block)
+        return self._feed(buffer, max(self._first, len(buffer) - self._lookahead))
+
+    def finish(self) -> list[tuple[int, Signature]]:
+        return self._feed(self._carry, len(self._carry))
+
+    def _feed(self, buffer: bytes, stop: int) -> list[tuple[int, Signature]]:
+        found = []
+        if stop > self._first:
+            with memoryview(buffer) as view:
+                positions = self._candidates(view, self._first, stop).tolist()
+            found = [(self._base + start, signature)
+                     for pos in positions for start, signature in self._match(buffer, pos)]
+        keep = max(0, stop - self._behind)
+        self._carry = buffer[keep:]
+        self._base += keep
+        self._first = stop - keep
+        return found
+
+
+def _estimate(buf, start: int, signature: Signature, size: int) -> int | None:
+    if signature.length is None:
+        return None
+    try:
+        length = signature.length(buf, start, size)
+    except (struct.error, IndexError, ValueError):
+        return None
+    return length if length and start + length <= size else None
+
+
+def measure(buf, found: list[tuple[int, Signature]], size: int = None, max_hits: int = MAX_HITS) -> list[Hit]:
+    """
+    Turns raw matches into hits: likely length of each file and the containers around it.
+    A match of the same format inside a container is counted as one of its parts (zip entries, ogg pages).
+    """
+    size = len(buf) if size is None else size
+    hits, stack = [], []
+    for start, signature in sorted(found, key=lambda match: match[0]):
+        while stack and stack[-1].end is not None and stack[-1].end <= start:
+            stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None and parent.name == signature.name and parent.end is not None:
+            parent.parts += 1
+            continue
+        if len(hits) >= max_hits:
+            break
+
+        hit = Hit(start, signature.name, signature.description, _estimate(buf, start, signature, size),
+                  depth=len(stack), parent=parent.offset if parent else None)
+        hits.append(hit)
+        if hit.end is not None:
+            stack.append(hit)
+    return hits
+
+
+def identify(head: bytes, signatures: list[Signature] = None) -> Signature | None:
+    """Signature of a file from its first bytes (HEAD_SIZE are enough), None when no magic matches at its offset."""
+    for signature in signatures or SIGNATURES:
+        at = signature.offset
+        if head[at:at + len(signature.magic)] != signature.magic:
+            continue
+        try:
+            if signature.check is None or signature.check(head, 0):
+                return signature
+        except (struct.error, IndexError):
+            continue    # header cut short, not this format
+    return None
+
+
+def carve(path: str, max_hits: int = MAX_HITS) -> list[Hit]:
+    """
+    Embedded files of a file in one linear pass over a memory map: offset, type, likely length and nesting.
+    Nothing is extracted.
+    """
+    if os.path.getsize(path) == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        return measure(mm, SignatureScanner().scan(mm), len(mm), max_hits)
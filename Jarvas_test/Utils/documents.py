@@ -6,7 +6,13 @@ from langchain_core.documents import Document
 from pathlib import Path
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import hashlib
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from logging import info
 from Agent.models import embedding_model
+from Utils.lexical import LexicalIndex
+from setup import INGEST_BATCH_SIZE, INGEST_MAX_IN_FLIGHT
 
 
 current_file_dir = Path(__file__).resolve().parent
@@ -17,6 +23,9 @@ txt_files_storage_path = current_file_dir.parent / "Documents" / "Info"
 # Emmbeddings locations.
 chromaDB_storage_path = str(current_file_dir.parent / "Documents" / "ChromaDB")
 
+# Rank constant of reciprocal rank fusion, 60 is the usual value.
+RRF_K = 60
+
 
 
 
@@ -34,13 +43,20 @@ class ChromaDB:
     def __init__(self, storage_p=chromaDB_storage_path, documents_p=txt_files_storage_path, embed_model=embedding_model):
         self.storage = storage_p
         self.text_entries = documents_p
+        self.manifest_path = Path(storage_p) / "ingest_manifest.json"
+        self.embed_model = embed_model
 
         self.vector_store = Chroma(
             collection_name="forensics",
             embedding_function=embed_model,
-            persist_directory=chromaDB_storage_path
+            persist_directory=self.storage
         )
 
+        # BM25 index kept in sync with the collection, for exact tokens (magic bytes, flags, filenames).
+        self.lexical = LexicalIndex(Path(storage_p) / "lexical.sqlite3")
+        if self.lexical.count() != self.vector_store._collection.count():
+            self._rebuild_lexical()
+
 
     def _get_content(self):
 
@@ -53,62 +69,175 @@ class ChromaDB:
                 content = f.read()                              #Stored in a variable, expecting small files.
                 yield content, file.name
 
-    def _create_document_list(self):
-
-        """Takes all txt files from text_entries to create Document class, uses get_content"""
-
-        docs = []
-        for content, filename in self._get_content():
-            docs.append(
-                Document(
-                    page_content=content,
-                    metadata={
-                        "source": "user",
-                        "name": filename
-                    }
-                )
-            )
-
-        return docs
-
-    def add_documents(self):
-        docs = self._create_document_list()
-
-        #Get list of file names
-        filenames_to_update = list(set(d.metadata.get("name") for d in docs if d.metadata.get("name")))
-
-        #If we are adding a file with the same name, we remove it first (to prevent dups)
-        #basically assume a file with the same name is being updated
-        if filenames_to_update:
-            for fname in filenames_to_update:
-                self.vector_store.delete(where={"name": fname})
+    def _load_manifest(self) -> dict:
+        """Manifest of what is already embedded: filename -> {"digest": sha256 of the file, "chunks": chunk ids}"""
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict):
+        tmp = self.manifest_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        tmp.replace(self.manifest_path)                         #Atomic, a crash never leaves half a manifest.
+
+    def _drop_chunks(self, manifest: dict, chunk_ids):
+        """Deletes chunks that no other file in the manifest still references (chunk ids are content hashes)."""
+        still_used = {cid for entry in manifest.values() for cid in entry["chunks"]}
+        orphaned = [cid for cid in set(chunk_ids) if cid not in still_used]
+        if orphaned:
+            self.vector_store.delete(ids=orphaned)
+            self.lexical.delete(orphaned)
+        return len(orphaned)
+
+    def _iter_new_chunks(self, manifest: dict, pending: dict, summary: dict):
 
+        """
+        Streams files one at a time and yields (filename, chunk_id, Document) for every chunk not stored yet.
+        Changed files are registered in pending until all their new chunks are written.
+        """
 
-        #Split text into chunks
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        split_docs = text_splitter.split_documents(docs)
 
+        for content, filename in self._get_content():
+            summary["seen"].add(filename)
+            digest = hashlib.sha256(content.encode()).hexdigest()
+
+            entry = manifest.get(filename)
+            if entry and entry["digest"] == digest:
+                summary["unchanged"] += 1
+                continue
+
+            chunks = {}                                         #Same chunk twice in a file is stored once.
+            for text in text_splitter.split_text(content):
+                chunks.setdefault(hashlib.md5(text.encode()).hexdigest(), text)
+            del content
+
+            #Chunks stored under this name, also covers databases filled before the manifest existed.
+            previous = set(entry["chunks"]) if entry else set()
+            previous.update(self.vector_store.get(where={"name": filename}, include=[])["ids"])
+
+            ids = list(chunks)
+            stored = set()
+            for start in range(0, len(ids), INGEST_BATCH_SIZE):
+                stored.update(self.vector_store.get(ids=ids[start:start + INGEST_BATCH_SIZE], include=[])["ids"])
+            new_ids = [cid for cid in ids if cid not in stored]
+
+            pending[filename] = {"digest": digest, "chunks": ids, "previous": previous, "remaining": len(new_ids)}
+            if not new_ids:
+                self._finish_file(manifest, pending, filename, summary)
+
+            for cid in new_ids:
+                yield filename, cid, Document(page_content=chunks[cid], metadata={"source": "user", "name": filename})
+
+    def _finish_file(self, manifest: dict, pending: dict, filename: str, summary: dict):
+        """All new chunks of the file are written: record it and drop the chunks it no longer has."""
+        entry = pending.pop(filename)
+        manifest[filename] = {"digest": entry["digest"], "chunks": entry["chunks"]}
+        summary["chunks_removed"] += self._drop_chunks(manifest, entry["previous"] - set(entry["chunks"]))
+        summary["updated"] += 1
+        self._save_manifest(manifest)
+
+    def _embed_batch(self, batch: list) -> list:
+        return self.embed_model.embed_documents([doc.page_content for _, _, doc in batch])
+
+    def _write_batch(self, manifest: dict, pending: dict, batch: list, embeddings: list, summary: dict):
+        """Writes an embedded batch to Chroma right away, files whose chunks are all written are recorded."""
+        self.vector_store._collection.upsert(
+            ids=[cid for _, cid, _ in batch],
+            embeddings=embeddings,
+            documents=[doc.page_content for _, _, doc in batch],
+            metadatas=[doc.metadata for _, _, doc in batch]
+        )
+        self.lexical.add(
+            ids=[cid for _, cid, _ in batch],
+            documents=[doc.page_content for _, _, doc in batch],
+            metadatas=[doc.metadata for _, _, doc in batch]
+        )
+        summary["chunks_added"] += len(batch)
+
+        for filename, _, _ in batch:
+            pending[filename]["remaining"] -= 1
+            if pending[filename]["remaining"] == 0:
+                self._finish_file(manifest, pending, filename, summary)
 
-        ids = [hashlib.md5(d.page_content.encode()).hexdigest() for d in split_docs]
+        info(f"Ingestion: {summary['chunks_added']} chunks written, {summary['updated']} files done")
 
-        self.vector_store.add_documents(documents=split_docs, ids=ids)
+    def add_documents(self):
 
-        # info(f"Added {len(split_docs)} chunks to the database.")
+        """
+        Incremental ingestion: only new or changed files are split, and only chunks that are not
+        stored yet are embedded. Chunks of deleted files are removed.
 
+        Chunks are embedded in batches of INGEST_BATCH_SIZE, with at most INGEST_MAX_IN_FLIGHT batches
+        waiting on the embedding model, and each batch is written as soon as it is embedded.
+        A file only enters the manifest once all its chunks are written, so an interrupted run
+        resumes where it stopped (chunks already stored are not embedded again).
+        """
 
+        manifest = self._load_manifest()
+        pending = {}
+        summary = {"seen": set(), "unchanged": 0, "updated": 0, "deleted": 0, "chunks_added": 0, "chunks_removed": 0}
+
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=INGEST_MAX_IN_FLIGHT, thread_name_prefix="embed") as pool:
+            batch = []
+            for item in self._iter_new_chunks(manifest, pending, summary):
+                batch.append(item)
+                if len(batch) < INGEST_BATCH_SIZE:
+                    continue
+                in_flight.append((batch, pool.submit(self._embed_batch, batch)))
+                batch = []
+                while len(in_flight) >= INGEST_MAX_IN_FLIGHT:
+                    done, future = in_flight.popleft()
+                    self._write_batch(manifest, pending, done, future.result(), summary)
+
+            if batch:
+                in_flight.append((batch, pool.submit(self._embed_batch, batch)))
+            while in_flight:
+                done, future = in_flight.popleft()
+                self._write_batch(manifest, pending, done, future.result(), summary)
+
+        for filename in set(manifest) - summary.pop("seen"):
+            removed = manifest.pop(filename)
+            summary["chunks_removed"] += self._drop_chunks(manifest, removed["chunks"])
+            summary["deleted"] += 1
+            self._save_manifest(manifest)
+
+        info(f"Database updated: {summary}")
+        return summary
+
+
+
+    def _rebuild_lexical(self):
+        """Fills the lexical index from the collection (databases created before it existed)."""
+        stored = self.vector_store.get(include=["documents", "metadatas"])
+        self.lexical.clear()
+        self.lexical.add(stored["ids"], stored["documents"], stored["metadatas"])
+        info(f"Lexical index rebuilt with {len(stored['ids'])} chunks")
 
     def search(self, query, k=3):
         """
-        Search and retrieve the most similar results
+        Hybrid search: BM25 and vector rankings fused with reciprocal rank fusion.
+        Falls back to the lexical ranking alone when the embedding model is not reachable.
         """
 
-        return self.vector_store.similarity_search(query,k=k)
-
-
-
-
-
-
+        candidates = k * 4
+        rankings = [[doc for doc, _ in self.lexical.search(query, k=candidates)]]
 
+        try:
+            rankings.append(self.vector_store.similarity_search(query, k=candidates))
+        except Exception as e:
+            info(f"Vector search unavailable, using lexical results only: {e}")
 
+        scores = {}
+        docs = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking):
+                key = doc.id or hashlib.md5(doc.page_content.encode()).hexdigest()
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
 
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [docs[key] for key in best]
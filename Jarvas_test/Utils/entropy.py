@@ -0,0 +1,166 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from math import gcd
+from multiprocessing import get_context
+import numpy as np
+
+
+CHUNK_SIZE = 1024 * 1024                # bytes histogrammed per vectorized pass, small enough to stay in cache
+MIN_BLOCK = 256                         # smallest block histogram, below it windows are histogrammed one by one
+PARALLEL_THRESHOLD = 512 * 1024 * 1024  # files above this size are mapped on several cores
+TASK_SIZE = 64 * 1024 * 1024            # bytes handed to a process at a time
+
+HIGH_ENTROPY = 7.5      # bits per byte, compressed or encrypted data
+LOW_ENTROPY = 1.0       # padding, sparse or zeroed data
+
+
+def _plogp(window: int) -> np.ndarray:
+    """c * log2(c) for every count a byte value can reach in a window."""
+    counts = np.arange(window + 1, dtype=np.float64)
+    table = np.zeros(window + 1)
+    table[1:] = counts[1:] * np.log2(counts[1:])
+    return table
+
+
+def _entropy(counts: np.ndarray, window: int, table: np.ndarray) -> np.ndarray:
+    """Shannon entropy (bits per byte) of every row of byte counts."""
+    return np.log2(window) - table[counts].sum(axis=1) / window
+
+
+def _histograms(data: np.ndarray, rows: int, width: int) -> np.ndarray:
+    """Byte counts of rows consecutive blocks of width bytes, one bincount for all of them."""
+    # intp keys, bincount would otherwise cast them first.
+    keys = (np.arange(rows, dtype=np.intp)[:, None] << 8) | data[:rows * width].reshape(rows, width)
+    return np.bincount(keys.ravel(), minlength=rows * 256).reshape(rows, 256)
+
+
+def window_counts(buf, window: int, stride: int, count: int) -> np.ndarray:
+    """
+    Byte counts of count windows of window bytes, stride bytes apart, from the start of buf, one row per window.
+
+    Windows overlapping or not, the bytes are histogrammed once in blocks of gcd(window, stride),
+    the count of a window is then the difference of two cumulative sums of the blocks.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8, count=(count - 1) * stride + window)
+    block = gcd(window, stride)
+
+    if block < MIN_BLOCK:
+        # Too many tiny blocks, histogram each window directly.
+        rows = np.lib.stride_tricks.sliding_window_view(data, window)[::stride][:count]
+        keys = (np.arange(count, dtype=np.intp)[:, None] << 8) | rows
+        return np.bincount(keys.ravel(), minlength=count * 256).reshape(count, 256)
+
+    counts = _histograms(data, len(data) // block, block)
+    span, step = window // block, stride // block
+    if span == 1:
+        return counts[::step][:count]
+
+    cumulative = np.zeros((len(counts) + 1, 256), dtype=np.int64)
+    np.cumsum(counts, axis=0, out=cumulative[1:])
+    starts = np.arange(count) * step
+    return cumulative[starts + span] - cumulative[starts]
+
+
+def counts_entropy(counts: np.ndarray, window: int) -> np.ndarray:
+    """Entropy of every row of window_counts."""
+    return _entropy(counts, window, _plogp(window))
+
+
+def window_entropy(buf, window: int, stride: int, count: int) -> np.ndarray:
+    """Entropy of count windows of window bytes, stride bytes apart, from the start of buf."""
+    return counts_entropy(window_counts(buf, window, stride, count), window)
+
+
+def _map_range(mm, first: int, count: int, window: int, stride: int) -> np.ndarray:
+    """
+    Entropy of windows first to first + count of a mapped file, CHUNK_SIZE bytes at a time.
+    With overlapping windows a pass also takes at most CHUNK_SIZE // window of them: each one costs a
+    row of 256 counts, and window keys when gcd(window, stride) is under MIN_BLOCK.
+    """
+    per_chunk = max(1, CHUNK_SIZE // max(stride, window, 256))
+    parts = []
+    for chunk in range(first, first + count, per_chunk):
+        windows = min(per_chunk, first + count - chunk)
+        start = chunk * stride
+        with memoryview(mm)[start:start + (windows - 1) * stride + window] as view:
+            parts.append(window_entropy(view, window, stride, windows))
+    return np.concatenate(parts)
+
+
+def _file_range(path: str, first: int, count: int, window: int, stride: int) -> np.ndarray:
+    """Worker process entry, maps the file on its own."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _map_range(mm, first, count, window, stride)
+
+
+def entropy_map(path: str, window: int = 4096, stride: int = None, workers: int = None) -> tuple[np.ndarray, int, int]:
+    """
+    Entropy of every window of a file, memory-mapped and processed chunk by chunk, so memory stays
+    bounded whatever the file size. Files over PARALLEL_THRESHOLD are split across processes.
+
+    :param window: bytes per window
+    :param stride: bytes between the starts of two windows, window by default (no overlap)
+    :param workers: processes to use, by default all cores for files over PARALLEL_THRESHOLD
+    :return: (entropies, window, stride), window and stride shrink to the file size for small files
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return np.zeros(0), window, stride or window
+
+    window = max(1, min(int(window), size))
+    stride = max(1, int(stride or window))
+    total = (size - window) // stride + 1
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if size > PARALLEL_THRESHOLD else 1
+    per_task = max(1, TASK_SIZE // stride)
+    tasks = [(first, min(per_task, total - first)) for first in range(0, total, per_task)]
+    workers = min(workers, len(tasks))
+
+    if workers <= 1:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            return _map_range(mm, 0, total, window, stride), window, stride
+
+    # spawn, the tool runs inside worker threads where fork is unsafe.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    pending, parts = deque(), []
+    try:
+        for first, count in tasks:
+            pending.append(pool.submit(_file_range, path, first, count, window, stride))
+            if len(pending) >= 2 * workers:     # bounded read-ahead
+                parts.append(pending.popleft().result())
+        while pending:
+            parts.append(pending.popleft().result())
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return np.concatenate(parts), window, stride
+
+
+@dataclass
+class EntropyRange:
+    start: int
+    end: int
+    kind: str           # high or low
+    mean: float
+
+
+def entropy_ranges(entropies: np.ndarray, window: int, stride: int, size: int,
+                   high: float = HIGH_ENTROPY, low: float = LOW_ENTROPY) -> list[EntropyRange]:
+    """
+    Consecutive windows over high or under low merged into byte ranges, in file order.
+    high is lowered by the bias of small windows: random bytes only reach about 8 - 255 / (2 * window * ln 2).
+    """
+    high -= 255 / (2 * window * np.log(2))
+    ranges = []
+    for kind, mask in (("high", entropies >= high), ("low", entropies <= low)):
+        edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+        for first, last in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+            ranges.append(EntropyRange(first * stride, min(size, (last - 1) * stride + window), kind,
+                                       float(entropies[first:last].mean())))
+    ranges.sort(key=lambda r: r.start)
+    return ranges
@@ -0,0 +1,177 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from logging import info
+from pathlib import Path
+from Utils.carving import HEAD_SIZE, identify
+from Utils.workspace import base_path, state_dir, walk_files
+
+
+HASH_BLOCK = 1024 * 1024
+HASH_WORKERS = 4            # files hashed at the same time, hashlib releases the GIL
+TEXT_BYTES = bytes(range(0x20, 0x7f)) + b"\t\n\r"
+
+
+@dataclass
+class Entry:
+    path: str               # relative to the workspace
+    size: int
+    mtime_ns: int
+    md5: str
+    sha256: str
+    type: str               # carving signature name, text, data or empty
+    description: str
+    changed: int            # scan that last saw it added or modified
+
+
+@dataclass
+class ScanResult:
+    scan: int
+    files: int
+    added: int
+    changed: int
+    removed: int
+    seconds: float
+
+
+def describe(path: str) -> dict:
+    """Hashes and type of a file, the type from its magic bytes (the carving signature table)."""
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(path, "rb") as f:
+        head = f.read(HEAD_SIZE)
+        md5.update(head)
+        sha256.update(head)
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            md5.update(block)
+            sha256.update(block)
+
+    signature = identify(head)
+    if signature:
+        kind, description = signature.name, signature.description
+    elif not head:
+        kind, description = "empty", "empty file"
+    elif not head.translate(None, TEXT_BYTES):
+        kind, description = "text", "ASCII text"
+    else:
+        kind, description = "data", "unknown binary data"
+    return {"md5": md5.hexdigest(), "sha256": sha256.hexdigest(), "type": kind, "description": description}
+
+
+class Inventory:
+
+    """
+    Files of a workspace with their size, mtime, hashes and type, in SQLite in the workspace state dir.
+    update() walks the workspace and only hashes the files whose size or mtime changed, every update
+    is a numbered scan so the files added or changed since the previous one can be listed.
+    """
+
+    def __init__(self, storage_p, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                type TEXT NOT NULL,
+                description TEXT NOT NULL,
+                changed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256);
+            CREATE INDEX IF NOT EXISTS files_changed ON files(changed);
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def update(self) -> ScanResult:
+        started = time.perf_counter()
+        with self._lock:
+            current = {Path(path).relative_to(self.root).as_posix(): stat for path, stat in walk_files(self.root).items()}
+            known = {row[0]: (row[1], row[2]) for row in self._conn.execute("SELECT path, size, mtime_ns FROM files")}
+            removed = [path for path in known if path not in current]
+            todo = [path for path, stat in current.items() if known.get(path) != stat]
+
+            scan = self._conn.execute("INSERT INTO scans (at) VALUES (?)", (time.time(),)).lastrowid
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+
+            if todo:
+                info(f"inventory: {len(todo)} files to hash under {self.root}")
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="inventory") as pool:
+                described = pool.map(self._describe, todo)
+                for path, details in zip(todo, described):
+                    if details is None:
+                        continue    # gone or unreadable since the walk
+                    self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       (path, *current[path], details["md5"], details["sha256"],
+                                        details["type"], details["description"], scan))
+            self._conn.commit()
+
+        added = sum(1 for path in todo if path not in known)
+        return ScanResult(scan, len(current), added, len(todo) - added, len(removed), time.perf_counter() - started)
+
+    def _describe(self, path: str) -> dict | None:
+        try:
+            return describe(str(self.root / path))
+        except OSError:
+            return None
+
+    def query(self, under: str = "", since: int = None, file_type: str = None, min_size: int = None,
+              max_size: int = None, limit: int = None) -> tuple[list[Entry], int]:
+        """
+        Files under the relative directory under, changed in a scan after since, of a type and size range.
+        Returns the first limit of them by path, and how many matched.
+        """
+        clauses, values = [], []
+        if under not in ("", "."):
+            prefix = under.rstrip("/") + "/"
+            clauses.append("substr(path, 1, ?) = ?")
+            values += [len(prefix), prefix]
+        for clause, value in (("changed > ?", since), ("type = ?", file_type),
+                              ("size >= ?", min_size), ("size <= ?", max_size)):
+            if value is not None:
+                clauses.append(clause)
+                values.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM files {where}", values).fetchone()[0]
+            rows = self._conn.execute(f"SELECT * FROM files {where} ORDER BY path LIMIT ?",
+                                      values + [limit if limit else -1]).fetchall()
+        return [Entry(*row) for row in rows], total
+
+    def duplicates(self, under: str = "") -> list[list[Entry]]:
+        """Groups of files with the same content, largest first."""
+        entries, _ = self.query(under)
+        groups = {}
+        for entry in entries:
+            if entry.size:
+                groups.setdefault(entry.sha256, []).append(entry)
+        return sorted((group for group in groups.values() if len(group) > 1), key=lambda g: -g[0].size)
+
+    def last_scan(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM scans").fetchone()[0]
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def workspace_inventory() -> Inventory:
+    """Inventory of the workspace of the current session."""
+    storage = state_dir() / "inventory.sqlite3"
+    with _inventories_lock:
+        if storage not in _inventories:
+            _inventories[storage] = Inventory(storage, base_path())
+        return _inventories[storage]
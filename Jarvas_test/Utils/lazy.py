@@ -0,0 +1,47 @@
+import threading
+
+
+class LazyObject:
+
+    """
+    Thread-safe lazy singleton.
+    Behaves like the object built by factory, which is only called on the first attribute access.
+    Used for model clients and the database so importing a module does not open connections.
+    """
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:          # another thread may have built it meanwhile
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def override(self, instance) -> None:
+        """Replaces the object, e.g. with a scripted model in benchmarks."""
+        with self._lock:
+            self._instance = instance
+
+    def reset(self) -> None:
+        """Drops the object, the next access builds a new one."""
+        with self._lock:
+            self._instance = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = repr(self._instance) if self._instance is not None else "not initialized"
+        return f"LazyObject({state})"
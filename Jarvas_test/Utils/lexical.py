@@ -0,0 +1,117 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from langchain_core.documents import Document
+
+
+# Keeps forensic tokens whole: flags (-sf), magic bytes (0x89504e47), file names (flag.png), picoCTF{...}
+TOKEN_PATTERN = re.compile(r"-{0,2}[a-z0-9_]+(?:[.\-/:{}][a-z0-9_]+)*}?")
+PART_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased tokens, compound tokens also contribute their parts ("flag.png" -> flag.png, flag, png)."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1 or (parts and parts[0] != token):
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+
+    """
+    Local BM25 inverted index over the RAG chunks, stored in SQLite next to the Chroma collection.
+    Works without the embedding model, so retrieval still answers when Ollama is down.
+    """
+
+    def __init__(self, storage_p, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            );
+            CREATE INDEX IF NOT EXISTS postings_id ON postings(id);
+        """)
+        self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict]) -> None:
+        with self._lock:
+            for cid, content, metadata in zip(ids, documents, metadatas):
+                self._conn.execute("DELETE FROM postings WHERE id = ?", (cid,))
+                terms = Counter(tokenize(content))
+                self._conn.execute("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)",
+                                   (cid, content, json.dumps(metadata), sum(terms.values())))
+                self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                                       [(term, cid, tf) for term, tf in terms.items()])
+            self._conn.commit()
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            for cid in ids:
+                self._conn.execute("DELETE FROM docs WHERE id = ?", (cid,))
+                self._conn.execute("DELETE FROM postings WHERE id = ?", (cid,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 3) -> list[tuple[Document, float]]:
+        """Top k chunks by BM25 score."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            total, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if total == 0:
+                return []
+            avg_length = total_length / total
+
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log((total - len(rows) + 0.5) / (len(rows) + 0.5) + 1)
+                for cid, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[cid] += idf * tf * (self.k1 + 1) / norm
+
+            results = []
+            for cid, score in scores.most_common(k):
+                content, metadata = self._conn.execute(
+                    "SELECT content, metadata FROM docs WHERE id = ?", (cid,)).fetchone()
+                results.append((Document(page_content=content, metadata=json.loads(metadata), id=cid), score))
+        return results
+
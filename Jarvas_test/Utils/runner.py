@@ -0,0 +1,257 @@
+import os
+import re
+import subprocess
+import threading
+import uuid
+from dataclasses import dataclass
+from logging import info
+from pathlib import Path
+from time import monotonic, sleep
+from setup import TOOL_TIMEOUT, TOOL_OUTPUT_BUDGET, TOOL_SPILL_MB
+from Utils.workspace import state_dir
+from Utils.tracing import add_usage
+from Utils.cache import mark_failure
+
+HANDLE_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+
+def output_dir() -> Path:
+    """Full outputs that did not fit the budget are kept here, inside the session workspace."""
+    return state_dir() / "output"
+
+READ_SIZE = 64 * 1024
+
+
+def prune_spilled(directory: Path, max_bytes: int = TOOL_SPILL_MB * 1024 * 1024) -> None:
+    """Drops the oldest spilled outputs until the directory holds at most max_bytes."""
+    files = []
+    for path in directory.glob("*.log"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue    # removed by another capture meanwhile
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def paging_fields(handle: str | None, total_bytes: int) -> dict:
+    """Extra fields for the tool result when the output did not fit the budget."""
+    if handle is None:
+        return {}
+    return {
+        "output_handle": handle,
+        "total_bytes": total_bytes,
+        "details": "Output was truncated to its start and end. Use read_output with the output_handle "
+                   "to page through the full output."
+    }
+
+
+class OutputCapture:
+
+    """
+    Bounded view over a stream of bytes.
+    Keeps the first and last budget/2 bytes in memory. Once the stream grows over the budget,
+    everything is spilled to a file in output_dir(), which the worker can page through with read_output.
+    """
+
+    def __init__(self, budget: int = TOOL_OUTPUT_BUDGET, spill: bool = True):
+        self.half = max(1, budget // 2)
+        self.spill = spill
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.handle = None
+        self._spill = None
+        self._directory = output_dir()    # resolved here, writes come from reader threads
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > 2 * self.half
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+
+        if self.spill and self._spill is None and self.total_bytes + len(data) > 2 * self.half:
+            # Until now head + tail hold every byte, they become the start of the spill file.
+            self.handle = uuid.uuid4().hex[:12]
+            self._directory.mkdir(parents=True, exist_ok=True)
+            prune_spilled(self._directory)
+            self._spill = open(self._directory / f"{self.handle}.log", "wb")
+            self._spill.write(self.head)
+            self._spill.write(self.tail)
+
+        if self._spill is not None:
+            self._spill.write(data)
+
+        self.total_bytes += len(data)
+
+        room = self.half - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+
+        self.tail += data
+        if len(self.tail) > self.half:
+            del self.tail[:-self.half]
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+
+    def paging(self) -> dict:
+        return paging_fields(self.handle, self.total_bytes)
+
+    def text(self) -> str:
+        if not self.truncated:
+            return (bytes(self.head) + bytes(self.tail)).decode("utf-8", errors="replace")
+
+        omitted = self.total_bytes - len(self.head) - len(self.tail)
+        where = f", output_handle={self.handle}" if self.handle else ""
+        return (self.head.decode("utf-8", errors="replace")
+                + f"\n...[{omitted} bytes omitted{where}]...\n"
+                + self.tail.decode("utf-8", errors="replace"))
+
+
+@dataclass
+class RunResult:
+    command: list
+    returncode: int | None
+    stdout: str
+    stderr: str
+    total_bytes: int
+    output_handle: str | None
+    timed_out: bool = False
+    cpu_s: float | None = None          # user + system time of the process
+    max_rss_kb: int | None = None      # peak, it includes the interpreter pages of the fork before exec
+
+    def paging(self) -> dict:
+        return paging_fields(self.output_handle, self.total_bytes)
+
+
+def _wait(process: subprocess.Popen, timeout: float = None):
+    """
+    Popen.wait that also returns the resource usage of the process (os.wait4), None where it is unavailable.
+    Raises subprocess.TimeoutExpired like Popen.wait.
+    """
+    if not hasattr(os, "wait4"):
+        process.wait(timeout=timeout)
+        return None
+
+    deadline = None if timeout is None else monotonic() + timeout
+    delay = 0.001
+    while process.returncode is None:
+        try:
+            pid, status, usage = os.wait4(process.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            # Already reaped by Popen (poll() in kill), no usage left to read.
+            process.wait()
+            return None
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            return usage
+        if monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        sleep(min(delay, max(0.0, deadline - monotonic())))
+        delay = min(delay * 2, 0.05)
+    return None
+
+
+def run_command(cmd: list, timeout: float = TOOL_TIMEOUT, budget: int = TOOL_OUTPUT_BUDGET,
+                input: bytes = None) -> RunResult:
+    """
+    Runs a command and streams its output into bounded captures instead of keeping it all in memory.
+    input, when given, is written to its stdin. The process is killed once it runs over timeout.
+    """
+
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE if input is not None else None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = OutputCapture(budget), OutputCapture(budget, spill=False)
+
+    def pump(stream, capture):
+        for block in iter(lambda: stream.read1(READ_SIZE), b""):
+            capture.write(block)
+        stream.close()
+
+    def feed():
+        try:
+            process.stdin.write(input)
+            process.stdin.close()
+        except OSError:
+            pass    # the process exited without reading it all
+
+    readers = [threading.Thread(target=pump, args=(process.stdout, stdout), daemon=True),
+               threading.Thread(target=pump, args=(process.stderr, stderr), daemon=True)]
+    if input is not None:
+        readers.append(threading.Thread(target=feed, daemon=True))
+    for reader in readers:
+        reader.start()
+
+    timed_out = False
+    try:
+        usage = _wait(process, timeout)
+    except subprocess.TimeoutExpired:
+        info(f"Killing {cmd[0]}, running for more than {timeout}s")
+        process.kill()
+        usage = _wait(process)
+        timed_out = True
+
+    for reader in readers:
+        # Children of a killed process can keep the pipes open, don't wait on them forever.
+        reader.join(timeout=5 if timed_out else None)
+    stdout.close()
+    stderr.close()
+
+    error = stderr.text()
+    if timed_out:
+        error += f"\nProcess killed after {timeout} seconds."
+        mark_failure(f"{cmd[0]} killed after {timeout}s")
+    elif process.returncode != 0:
+        mark_failure(f"{cmd[0]} exited with {process.returncode}")
+
+    cpu_s = usage.ru_utime + usage.ru_stime if usage else None
+    max_rss_kb = usage.ru_maxrss if usage else None
+    add_usage(cpu_s=cpu_s, max_rss_kb=max_rss_kb, output_bytes=stdout.total_bytes)
+
+    return RunResult(
+        command=cmd,
+        returncode=process.returncode,
+        stdout=stdout.text(),
+        stderr=error,
+        total_bytes=stdout.total_bytes,
+        output_handle=stdout.handle,
+        timed_out=timed_out,
+        cpu_s=cpu_s,
+        max_rss_kb=max_rss_kb
+    )
+
+
+def read_spilled(handle: str, offset: int = 0, length: int = TOOL_OUTPUT_BUDGET) -> dict:
+    """Reads a page of a spilled output."""
+    if not HANDLE_PATTERN.match(handle):
+        raise ValueError(f"Invalid output handle: {handle}")
+
+    path = output_dir() / f"{handle}.log"
+    if not path.is_file():
+        raise ValueError(f"Output {handle} does not exist.")
+
+    size = path.stat().st_size
+    offset = max(0, min(offset, size))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(max(0, length))
+
+    next_offset = offset + len(data)
+    return {
+        "output_handle": handle,
+        "offset": offset,
+        "terminal": data.decode("utf-8", errors="replace"),
+        "next_offset": next_offset if next_offset < size else None,
+        "total_bytes": size
+    }
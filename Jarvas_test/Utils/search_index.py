@@ -0,0 +1,339 @@
+import os
+import sqlite3
+import threading
+from logging import info
+from pathlib import Path
+import numpy as np
+from Utils.workspace import state_dir, walk_files
+
+
+MAX_FILE_SIZE = 32 * 1024 * 1024   # larger files are not indexed, grep always reads them
+MAX_TRIGRAMS = 200_000             # files with more distinct trigrams (binaries, compressed data) are not indexed either
+MAX_CANDIDATES = 2000              # over this many candidate files, plain grep -r is as good
+BITMAP_SIZE = 1024 * 1024          # from this file size, distinct trigrams are marked in a bitmap instead of sorted
+
+# Options the index can answer for. -v, -L and -c also report the files that do not match, -P and -z
+# change what a match is, anything else (--include, -e, ...) goes to plain grep.
+INDEXED_OPTIONS = set("rinlwxHhsoEFIa")
+
+# ASCII case folding, the index is case insensitive and serves -i and plain searches alike.
+FOLD = np.arange(256, dtype=np.uint8)
+FOLD[ord("A"):ord("Z") + 1] += 32
+
+
+def trigrams(data: bytes) -> np.ndarray:
+    """Distinct trigrams of data, case folded, as sorted integers (3 bytes, big endian)."""
+    folded = FOLD[np.frombuffer(data, dtype=np.uint8)].astype(np.uint32)
+    if len(folded) < 3:
+        return np.zeros(0, dtype=np.int64)
+    keys = (folded[:-2] << 16) | (folded[1:-1] << 8) | folded[2:]
+    if len(keys) < BITMAP_SIZE:
+        return np.unique(keys).astype(np.int64)
+    seen = np.zeros(1 << 24, dtype=bool)
+    seen[keys] = True
+    return np.flatnonzero(seen)
+
+
+#-------PATTERN TO QUERY-------
+
+def _skip_group(pattern: str, i: int) -> int | None:
+    """Index after the group opened at pattern[i], None when it is not closed."""
+    depth = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            i = _skip_bracket(pattern, i)
+            if i is None:
+                return None
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def _skip_bracket(pattern: str, i: int) -> int | None:
+    """Index after the bracket expression opened at pattern[i], None when it is not closed."""
+    j = i + 1
+    if j < len(pattern) and pattern[j] == "^":
+        j += 1
+    if j < len(pattern) and pattern[j] == "]":
+        j += 1                                  # a leading ] is part of the set
+    while j < len(pattern):
+        if pattern[j] == "[" and pattern[j + 1:j + 2] in (":", "=", "."):
+            # [:alpha:], [=a=] and [.-.] hold a ] of their own.
+            close = pattern.find(pattern[j + 1] + "]", j + 2)
+            if close < 0:
+                return None
+            j = close + 2
+        elif pattern[j] == "]":
+            return j + 1
+        else:
+            j += 1
+    return None
+
+
+def _skip_basic_group(pattern: str, i: int) -> int | None:
+    """Index after the basic regex group whose \\( ends at pattern[i - 1], None when it is not closed."""
+    depth = 1
+    while i < len(pattern):
+        if pattern.startswith("\\(", i):
+            depth += 1
+        elif pattern.startswith("\\)", i):
+            depth -= 1
+            if depth == 0:
+                return i + 2
+        i += 2 if pattern[i] == "\\" else 1
+    return None
+
+
+def required_literals(pattern: str) -> list[list[str]] | None:
+    """
+    Literal strings a match must contain: one list per top level alternative, every literal of the
+    list is in the match. Conservative for basic and extended regexes alike, anything it does not
+    understand only ends a literal (or gives None, grep then reads every file).
+    """
+    alternatives, literals, run = [], [], []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        escaped = None
+        if c == "\\":
+            if i + 1 == len(pattern):
+                return None
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped == "|":
+                c = "|"
+            elif escaped in "{+?":
+                c = escaped                     # basic regex operators
+            elif escaped == "(":
+                # Basic regex group, it may be optional: skipped. In an extended regex it is a literal (, skipping
+                # up to \) only loses precision.
+                literals.append("".join(run))
+                run = []
+                i = _skip_basic_group(pattern, i)
+                if i is None:
+                    return None
+                continue
+            elif escaped.isalnum() or escaped in ")<>`'":
+                # classes, anchors, back-references
+                literals.append("".join(run))
+                run = []
+                continue
+            else:
+                run.append(escaped)
+                continue
+        else:
+            i += 1
+
+        if c == "|":
+            literals.append("".join(run))
+            alternatives.append(literals)
+            literals, run = [], []
+        elif c in "*+?{":
+            # The previous character is optional or repeated, what came before it is still required.
+            run = run[:-1]
+            literals.append("".join(run))
+            run = []
+            if c == "{":
+                close = pattern.find("}", i)
+                i = close + 1 if close >= 0 else i
+        elif escaped is None and c in "([.^$)":
+            literals.append("".join(run))
+            run = []
+            if c == "(":
+                i = _skip_group(pattern, i - 1)
+            elif c == "[":
+                i = _skip_bracket(pattern, i - 1)
+            if i is None:
+                return None
+        else:
+            run.append(c)
+
+    literals.append("".join(run))
+    alternatives.append(literals)
+    return [[literal for literal in alternative if len(literal.encode()) >= 3] for alternative in alternatives]
+
+
+def plan_query(pattern: str, options: str) -> list[np.ndarray] | None:
+    """
+    Trigrams of every alternative of the pattern, a file may match when it has all the trigrams of
+    one of them. None when grep has to read every file: options the index does not serve, or an
+    alternative without a literal of 3 bytes.
+    """
+    flags = options[1:] if options.startswith("-") and not options.startswith("--") else None
+    if not flags or "r" not in flags or not set(flags) <= INDEXED_OPTIONS:
+        return None
+
+    if "F" in flags:
+        alternatives = [[line] for line in pattern.split("\n")]
+    else:
+        alternatives = required_literals(pattern)
+        if alternatives is None:
+            return None
+
+    query = []
+    for literals in alternatives:
+        if "i" in flags:
+            # -i folds more than ASCII, the index does not.
+            literals = [part for literal in literals for part in _ascii_parts(literal)]
+        wanted = np.unique(np.concatenate([trigrams(literal.encode()) for literal in literals] or [np.zeros(0)]))
+        if not len(wanted):
+            return None
+        query.append(wanted.astype(np.uint32))
+    return query
+
+
+def _ascii_parts(literal: str) -> list[str]:
+    """ASCII runs of a literal, used with -i."""
+    parts, run = [], []
+    for c in literal:
+        if c.isascii():
+            run.append(c)
+        else:
+            parts.append("".join(run))
+            run = []
+    parts.append("".join(run))
+    return parts
+
+
+#-------INDEX-------
+
+class TrigramIndex:
+
+    """
+    Trigram index of the files of a workspace, stored in SQLite in the workspace state dir: one row per
+    file with its sorted trigrams, loaded in memory on first use. Every search first walks the searched
+    tree (without .jarvas) and re-indexes the files whose size or mtime changed, so the index never answers for content
+    it has not seen.
+    """
+
+    def __init__(self, storage_p):
+        self._lock = threading.Lock()
+        self._stats = None          # path -> (size, mtime_ns) of the indexed files, read on first use
+        self._loaded = {}           # path -> sorted trigrams, None for files that are not indexed
+        self._generation = 0        # bumped on every change, views older than it are rebuilt
+        self._views = {}            # root -> (generation, paths, keys)
+
+        Path(storage_p).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(storage_p), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                trigrams BLOB
+            );
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def _read(path: str, size: int) -> np.ndarray | None:
+        if size > MAX_FILE_SIZE:
+            return None
+        try:
+            with open(path, "rb") as f:
+                keys = trigrams(f.read())
+        except OSError:
+            return None
+        return keys.astype(np.uint32) if len(keys) <= MAX_TRIGRAMS else None
+
+    def refresh(self, root: str) -> list[str]:
+        """Brings the files under root up to date, returns their paths."""
+        if self._stats is None:
+            self._stats = {row[0]: (row[1], row[2]) for row in self._conn.execute("SELECT path, size, mtime_ns FROM files")}
+
+        current = walk_files(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        stale = {path for path, stat in self._stats.items() if path.startswith(prefix) and current.get(path) != stat}
+        added = [path for path in current if path not in self._stats or path in stale]
+        if stale or added:
+            info(f"search index: {len(added)} files to index under {root}, {len(stale)} changed or removed")
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in stale])
+            for path in stale:
+                del self._stats[path]
+                self._loaded.pop(path, None)
+            for path in added:
+                keys = self._read(path, current[path][0])
+                self._conn.execute("INSERT INTO files VALUES (?, ?, ?, ?)",
+                                   (path, *current[path], keys.tobytes() if keys is not None else None))
+                self._stats[path] = current[path]
+                self._loaded[path] = keys
+            self._conn.commit()
+            self._generation += 1
+        return sorted(current)
+
+    def _view(self, root: str, paths: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Trigrams of every indexed file under root in one sorted array, file number << 24 | trigram,
+        so a query probes all the files at once. Rebuilt when a file changed.
+        """
+        view = self._views.get(root)
+        if view and view[0] == self._generation:
+            return view[1], view[2]
+
+        missing = [path for path in paths if path not in self._loaded]
+        for start in range(0, len(missing), 500):
+            batch = missing[start:start + 500]
+            query = f"SELECT path, trigrams FROM files WHERE path IN ({', '.join('?' * len(batch))})"
+            for path, blob in self._conn.execute(query, batch):
+                self._loaded[path] = np.frombuffer(blob, dtype=np.uint32) if blob is not None else None
+
+        parts = [self._loaded[path].astype(np.uint64) | np.uint64(number << 24) for number, path in enumerate(paths)
+                 if self._loaded[path] is not None]
+        keys = np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint64)
+        self._views[root] = (self._generation, paths, keys)
+        return paths, keys
+
+    def candidates(self, root: str, query: list[np.ndarray]) -> tuple[list[str], int]:
+        """Files under root that may match the query, and the number of files under root."""
+        with self._lock:
+            paths, keys = self._view(root, self.refresh(root))
+            unindexed = [number for number, path in enumerate(paths) if self._loaded[path] is None]
+
+        numbers = np.arange(len(paths), dtype=np.uint64)
+        matching = np.zeros(len(paths), dtype=bool)
+        matching[unindexed] = True
+        if len(keys):
+            for wanted in query:
+                probes = (numbers[:, None] << np.uint64(24)) | wanted.astype(np.uint64)[None, :]
+                found = np.searchsorted(keys, probes)
+                matching |= (keys[np.minimum(found, len(keys) - 1)] == probes).all(axis=1)
+        return [paths[number] for number in np.flatnonzero(matching)], len(paths)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def workspace_index() -> TrigramIndex:
+    """Index of the workspace of the current session."""
+    storage = state_dir() / "search_index.sqlite3"
+    with _indexes_lock:
+        if storage not in _indexes:
+            _indexes[storage] = TrigramIndex(storage)
+        return _indexes[storage]
+
+
+def grep_candidates(path: str, pattern: str, options: str) -> tuple[list[str], int] | None:
+    """
+    Files of the directory path grep has to read for the pattern, and the number of files under path.
+    None when the index cannot narrow the search: plain grep then.
+    """
+    if not os.path.isdir(path):
+        return None
+    query = plan_query(pattern, options)
+    if query is None:
+        return None
+    candidates, total = workspace_index().candidates(path, query)
+    if len(candidates) > MAX_CANDIDATES:
+        return None
+    return candidates, total
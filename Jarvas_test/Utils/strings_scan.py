@@ -0,0 +1,171 @@
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+
+
+# Same byte class as GNU strings: printable ASCII and tab.
+PRINTABLE = np.zeros(256, dtype=bool)
+PRINTABLE[0x20:0x7f] = True
+PRINTABLE[0x09] = True
+
+ENCODINGS = ("ascii", "utf-16le")
+
+CHUNK_SIZE = 16 * 1024 * 1024           # even, so utf-16 pairs keep their alignment across chunks
+EXTEND_SIZE = 4096                      # step used to follow a string past the end of its chunk
+PARALLEL_THRESHOLD = 256 * 1024 * 1024  # files above this size are scanned on several cores
+
+
+def _runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Start and end indexes of every run of True values."""
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def _ascii_mask(view) -> np.ndarray:
+    return PRINTABLE[np.frombuffer(view, dtype=np.uint8)]
+
+
+def _utf16_mask(view) -> np.ndarray:
+    """One value per (lo, hi) byte pair: printable ASCII character followed by a zero byte."""
+    data = np.frombuffer(view, dtype=np.uint8)
+    pairs = len(data) // 2
+    return PRINTABLE[data[0:2 * pairs:2]] & (data[1:2 * pairs:2] == 0)
+
+
+def _scan_ascii(buf, size: int, start: int, end: int, min_length: int) -> list:
+    found = []
+    starts, ends = _runs(_ascii_mask(buf[start:end]))
+    # Only runs long enough or reaching the end of the chunk can be reported.
+    keep = (ends - starts >= min_length) | (ends == end - start)
+    starts, ends = starts[keep], ends[keep]
+
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        s += start
+        e += start
+        if s == start and start > 0 and PRINTABLE[buf[start - 1]]:
+            continue    # the string began in the previous chunk, which reports it.
+        if e == end:
+            # The string runs into the next chunk, follow it.
+            while e < size:
+                step = min(EXTEND_SIZE, size - e)
+                stop = np.flatnonzero(~_ascii_mask(buf[e:e + step]))
+                if len(stop):
+                    e += int(stop[0])
+                    break
+                e += step
+        if e - s >= min_length:
+            found.append((s, "ascii", bytes(buf[s:e]).decode("ascii")))
+
+    return found
+
+
+def _scan_utf16(buf, size: int, start: int, end: int, min_length: int) -> list:
+    found = []
+
+    for align in (0, 1):
+        first = start + align
+        last = min(end + align, size)       # pairs starting in the chunk, hi byte may be past its end
+        if last - first < 2:
+            continue
+        starts, ends = _runs(_utf16_mask(buf[first:last]))
+        limit = first + 2 * ((last - first) // 2)
+        keep = (ends - starts >= min_length) | (first + 2 * ends == limit)
+        starts, ends = starts[keep], ends[keep]
+
+        for s, e in zip(starts.tolist(), ends.tolist()):
+            s = first + 2 * s
+            e = first + 2 * e
+            if s == first and first >= 2 and _utf16_mask(buf[first - 2:first])[0]:
+                continue    # the string began in the previous chunk.
+            if e == limit:
+                while e + 2 <= size:
+                    step = min(EXTEND_SIZE, size - e) & ~1
+                    stop = np.flatnonzero(~_utf16_mask(buf[e:e + step]))
+                    if len(stop):
+                        e += 2 * int(stop[0])
+                        break
+                    e += step
+            if (e - s) // 2 >= min_length:
+                found.append((s, "utf-16le", bytes(buf[s:e]).decode("utf-16le")))
+
+    return found
+
+
+def scan_buffer(buf, start: int, end: int, min_length: int = 4, encodings=("ascii",), size: int = None) -> list:
+    """
+    Finds printable strings that start in buf[start:end], sorted by offset.
+    Strings crossing end are followed to their real end, strings crossing start belong to the previous range.
+    :return: list of (offset, encoding, text)
+    """
+    view = memoryview(buf)      # slices of a memoryview don't copy the mapped file
+    size = len(view) if size is None else size
+    found = []
+    try:
+        if "ascii" in encodings:
+            found += _scan_ascii(view, size, start, end, min_length)
+        if "utf-16le" in encodings:
+            found += _scan_utf16(view, size, start, end, min_length)
+    finally:
+        view.release()
+    found.sort(key=lambda hit: hit[0])
+    return found
+
+
+def _scan_file_range(path: str, start: int, end: int, min_length: int, encodings: tuple) -> list:
+    """Worker process entry, maps the file on its own."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return scan_buffer(mm, start, end, min_length, encodings)
+
+
+def _encodings(encoding: str) -> tuple:
+    if encoding == "both":
+        return ENCODINGS
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding}, use one of: ascii, utf-16le, both.")
+    return (encoding,)
+
+
+def iter_strings(path: str, min_length: int = 4, encoding: str = "ascii", workers: int = None,
+                 chunk_size: int = CHUNK_SIZE):
+    """
+    Lazily yields (offset, encoding, text) for every printable string in a file.
+    The file is memory-mapped and scanned chunk by chunk, so the caller can stop after
+    any number of hits. Large files are scanned on several processes, results stay in offset order.
+
+    :param encoding: ascii, utf-16le or both
+    :param workers: processes to use, by default all cores for files over PARALLEL_THRESHOLD
+    """
+    encodings = _encodings(encoding)
+    min_length = max(1, int(min_length))
+    chunk_size = max(2, chunk_size & ~1)
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+
+    ranges = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+    if workers is None:
+        workers = (os.cpu_count() or 1) if size > PARALLEL_THRESHOLD else 1
+    workers = min(workers, len(ranges))
+
+    if workers <= 1:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start, end in ranges:
+                yield from scan_buffer(mm, start, end, min_length, encodings)
+        return
+
+    # spawn, the tool runs inside worker threads where fork is unsafe.
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    pending = deque()
+    try:
+        for start, end in ranges:
+            pending.append(pool.submit(_scan_file_range, path, start, end, min_length, encodings))
+            if len(pending) >= 2 * workers:     # bounded read-ahead
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
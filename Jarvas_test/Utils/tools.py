@@ -1,10 +1,16 @@
-from langchain.tools import tool
-import subprocess
-from Utils.documents import ChromaDB
+from langchain_core.tools import tool
+from Utils.cache import cached_tool
+from Utils.lazy import LazyObject
+from Utils.runner import run_command, read_spilled, OutputCapture
+from Utils.workspace import base_path, STATE_DIR_NAME
+from setup import GREP_INDEX
 from logging import info
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import base64
-from setup import WORKING_DIR
+import os
+import re
 
 from functools import wraps
 
@@ -20,25 +26,25 @@ def handle_tool_errors(func):
             return f"An unexpected error occurred: {str(e)}"
     return wrapper
 
-BASE_PATH = Path(WORKING_DIR).resolve()
-
 
 def validate_path(file_path: str) -> str:
     """
-    Strictly validates that the file_path is within the BASE_PATH.
+    Strictly validates that the file_path is within the workspace of the current session.
     Prevents path traversal.
     """
 
+    workspace = base_path()
+
     requested_path = Path(file_path)
 
     if requested_path.is_absolute(): #verifies if path is absolute, or should be appended to the default path.
         full_path = requested_path.resolve()
     else:
-        full_path = (BASE_PATH / requested_path).resolve()
+        full_path = (workspace / requested_path).resolve()
 
 
 
-    if not str(full_path).startswith(str(BASE_PATH)): #if the path does not start with the base path, raise error.
+    if full_path != workspace and workspace not in full_path.parents: #if the path is not inside the workspace, raise error (a prefix check would let /ws/a2 through for /ws/a).
         info(f"Invalid Path: {full_path}")
         raise ValueError(f"Access Denied: {file_path} is outside the workspace.")
 
@@ -47,7 +53,11 @@ def validate_path(file_path: str) -> str:
 
 
 #------RAG TOOLS--------
-GLOBAL_DB = ChromaDB()
+def _open_database():
+    from Utils.documents import ChromaDB    #chromadb is heavy, only imported once the RAG is used.
+    return ChromaDB()
+
+GLOBAL_DB = LazyObject(_open_database)
 
 @tool("retrieve_data")
 def retrieve_data(query: str):
@@ -74,36 +84,60 @@ def update_rag():
     If user requests to update the database, use this function.
     """
 
-    GLOBAL_DB.add_documents()
+    return GLOBAL_DB.add_documents()
 
 
 #------FORENSICS TOOLS-------
 
-@tool("strings")  #strings is a bit complicated, don't want to use strings on an image.
+@tool("strings")  #native scanner, output is bounded so it is safe on large images.
 @handle_tool_errors
-def strings_tool(file_path: str) -> dict[str,str]:
+@cached_tool("strings", resolve=validate_path)
+def strings_tool(file_path: str, min_length: int = 4, encoding: str = "ascii", pattern: str = None,
+                 max_results: int = None) -> dict[str,str]:
 
-    """Extracts readable strings from a binary file."""
+    """
+    Extracts readable strings from a binary file, with their offsets.
+    Every string is returned, a long output is truncated and can be paged with read_output.
+    :param file_path: string path
+    :param min_length: minimum number of characters of a string
+    :param encoding: ascii, utf-16le (windows wide strings) or both
+    :param pattern: optional regex, only strings matching it are returned (e.g. "picoCTF|flag")
+    :param max_results: optional, stop after this many strings
+    :return: offset and text of every string found
+    """
 
-    print("\nStrings has been used")
-    result = subprocess.run(
-        ["strings", validate_path(file_path)],
-        capture_output=True,
-        text=True
-    )
+    from Utils.strings_scan import iter_strings
 
-    print(result.stdout)
-    print(result.stderr)
+    path = validate_path(file_path)
+    regex = re.compile(pattern) if pattern else None
+
+    output = OutputCapture()
+    found, last = 0, None
+    for offset, _, text in iter_strings(path, min_length=min_length, encoding=encoding):
+        if regex and not regex.search(text):
+            continue
+        output.write(f"{offset:#x} {text}\n".encode())
+        found += 1
+        if max_results and found >= max_results:
+            last = offset
+            break
+    output.close()
 
     content = {
-        "command": f"strings {validate_path(file_path)}",
-        "terminal": result.stdout,
-        "error": result.stderr
+        "command": f"strings -n {min_length} ({encoding}) {path}" + (f" matching {pattern}" if pattern else ""),
+        "terminal": output.text(),
+        "error": "",
+        "found": found,
+        **output.paging()
     }
+    if last is not None:
+        content["truncated"] = True
+        content["details"] = (f"Stopped after max_results={max_results} strings, the last one at {last:#x}. "
+                              f"Run it again without max_results to get the rest.")
 
     return content
 
-@tool("binwalk")
+@tool("binwalk")  #not cached, binwalk always extracts into the workspace.
 @handle_tool_errors
 def binwalk_extract(file_path: str, file_type: str = None):
     """
@@ -119,23 +153,157 @@ def binwalk_extract(file_path: str, file_type: str = None):
 
     info(f"Executing: {' '.join(bw_cmd)}")
 
-    bw_cmd.extend(["-C", f"{WORKING_DIR}"])
+    bw_cmd.extend(["-C", str(base_path())])
 
-    result = subprocess.run(bw_cmd, capture_output=True, text=True)
+    result = run_command(bw_cmd)
 
     return {
         "status": "Success" if result.returncode == 0 else "Error",
         "output": result.stdout,
-        "error": result.stderr
+        "error": result.stderr,
+        **result.paging()
     }
 
+@tool("carve")  #native single pass over a memory map, cheaper than file + binwalk on large images.
+@handle_tool_errors
+@cached_tool("carve", resolve=validate_path)
+def carve_scan(file_path: str, max_results: int = 200) -> dict[str,str]:
+    """
+    Finds the files embedded in a binary (png, jpeg, zip, gzip, 7z, rar, pdf, elf, sqlite, media...) without
+    extracting them. Use it before binwalk to know what is inside and where.
+    :param file_path: string path
+    :param max_results: stop after this many embedded files
+    :return: offset, type, likely length and nesting of every embedded file
+    """
+
+    from Utils.carving import carve
+
+    path = validate_path(file_path)
+    hits = carve(path, max_hits=max_results)
+
+    output = OutputCapture()
+    for hit in hits:
+        length = f"{hit.length} bytes" if hit.length is not None else "length unknown"
+        parts = f", {hit.parts + 1} parts" if hit.parts else ""
+        output.write(f"{'  ' * hit.depth}{hit.offset:#x} {hit.name}: {hit.description}, {length}{parts}\n".encode())
+    output.close()
+
+    content = {
+        "command": f"carve {path}",
+        "terminal": output.text() or "No embedded file signature found.",
+        "error": "",
+        "found": len(hits),
+        **output.paging()
+    }
+    if len(hits) > 1:
+        content["details"] = "Indented entries are inside the entry above them. Use binwalk to extract them."
+
+    return content
+
+@tool("entropy")  #native, NumPy histograms over a memory map, memory stays bounded on large images.
+@handle_tool_errors
+@cached_tool("entropy", resolve=validate_path)
+def entropy_tool(file_path: str, window: int = 4096, stride: int = None, max_ranges: int = 30) -> dict[str,str]:
+    """
+    Shannon entropy map of a file, to find encrypted or compressed regions (high entropy) and padding or
+    zeroed regions (low entropy) inside a blob.
+    :param file_path: string path
+    :param window: bytes per measured window, smaller windows find smaller regions
+    :param stride: bytes between two windows, window by default
+    :param max_ranges: ranges listed, the largest ones are kept
+    :return: overall entropy and the byte ranges of high and low entropy
+    """
+
+    from Utils.entropy import entropy_map, entropy_ranges
+
+    path = validate_path(file_path)
+    size = Path(path).stat().st_size
+    entropies, window, stride = entropy_map(path, window, stride)
+    if not len(entropies):
+        return {"command": f"entropy {path}", "terminal": "The file is empty.", "error": ""}
+
+    ranges = entropy_ranges(entropies, window, stride, size)
+    listed = sorted(sorted(ranges, key=lambda r: r.end - r.start, reverse=True)[:max_ranges], key=lambda r: r.start)
+    share = {kind: sum(r.end - r.start for r in ranges if r.kind == kind) / size for kind in ("high", "low")}
+
+    lines = [
+        f"{size} bytes, {len(entropies)} windows of {window} bytes: mean {entropies.mean():.2f}, "
+        f"min {entropies.min():.2f}, max {entropies.max():.2f} bits/byte",
+        f"high entropy (compressed or encrypted): {share['high']:.0%}, low (padding or zeroed): {share['low']:.0%}",
+    ]
+    lines += [f"{r.start:#x}-{r.end:#x} {r.kind} ({r.end - r.start} bytes, mean {r.mean:.2f})" for r in listed]
+    if len(ranges) > len(listed):
+        lines.append(f"...{len(ranges) - len(listed)} smaller ranges not listed")
+
+    return {
+        "command": f"entropy -w {window} -s {stride} {path}",
+        "terminal": "\n".join(lines),
+        "error": ""
+    }
+
+@tool("triage")  #one read of the file for every native analysis, then only the external tools that apply.
+@handle_tool_errors
+@cached_tool("triage", resolve=validate_path)
+def triage_tool(file_path: str) -> dict[str,str]:
+    """
+    First look at a new file, in one call: hashes, file type, embedded files, entropy, a sample of its strings
+    and any flag, plus exiftool for images and ffprobe for media. Use it before the other tools.
+    :param file_path: string path
+    :return: compact report
+    """
+
+    from Utils.triage import triage, STRING_MIN_LENGTH
+
+    path = validate_path(file_path)
+    report = triage(path)
+
+    # External tools the file type calls for, side by side, in the session workspace.
+    external = {"image": [("exiftool", exiftool)], "media": [("ffprobe", ffprobe_check)]}.get(report.kind, [])
+    with ThreadPoolExecutor(max_workers=max(1, len(external))) as pool:
+        futures = {name: pool.submit(contextvars.copy_context().run, t.invoke, {"file_path": path})
+                   for name, t in external}
+        outputs = {name: future.result() for name, future in futures.items()}
+
+    file_type = f"{report.file_type.name}: {report.file_type.description}" if report.file_type else "unknown"
+    lines = [
+        f"{report.size} bytes, type {file_type}",
+        *(f"{name} {digest}" for name, digest in report.hashes.items()),
+        f"entropy {report.entropy:.2f} bits/byte, {report.printable:.0%} printable",
+    ]
+    lines += [f"  {r.start:#x}-{r.end:#x} {r.kind} entropy (mean {r.mean:.2f})" for r in report.entropy_ranges[:10]]
+    if report.embedded:
+        lines.append(f"embedded files ({len(report.embedded)}):")
+        lines += [f"  {'  ' * hit.depth}{hit.offset:#x} {hit.name}: {hit.description}"
+                  + (f", {hit.length} bytes" if hit.length else "") for hit in report.embedded[:20]]
+    if report.flags:
+        lines.append("flags:")
+        lines += [f"  {offset:#x} {flag}" for offset, flag in report.flags]
+    lines.append(f"{report.strings} strings of {STRING_MIN_LENGTH}+ characters, sample:")
+    lines += [f"  {offset:#x} {text[:120]}" for offset, text in report.string_samples]
+
+    for name, output in outputs.items():
+        text = output.get("terminal") or output.get("error") if isinstance(output, dict) else str(output)
+        lines.append(f"{name}:")
+        lines.append(str(text).strip()[:2000] or "(no output)")
+
+    content = {
+        "command": f"triage {path}",
+        "terminal": "\n".join(lines),
+        "error": "",
+    }
+    if report.embedded:
+        content["details"] = "Use binwalk to extract the embedded files, carve to list all of them."
+
+    return content
+
 @tool("ffprobe_check")
 @handle_tool_errors
+@cached_tool("ffprobe_check", resolve=validate_path)
 def ffprobe_check(file_path: str):
     """Lists all streams (video, audio, subtitles) inside a media file."""
     path = validate_path(file_path)
     cmd = ["ffprobe", "-v", "error", "-show_entries", "stream=index,codec_type", "-of", "csv=p=0", path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_command(cmd)
     content = {
         "command": f"{cmd} {validate_path(file_path)}",
         "terminal": result.stdout,
@@ -153,7 +321,7 @@ def ffmpeg_extract(file_path: str, stream_index: int, extension: str):
     path = validate_path(file_path)
     output = f"{path}_extracted_{stream_index}.{extension}"
     cmd = ["ffmpeg", "-i", path, "-map", f"0:{stream_index}", "-c", "copy", output]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_command(cmd)
     content = {
         "command": f"{cmd} {validate_path(file_path)}",
         "terminal": result.stdout,
@@ -176,11 +344,7 @@ def display_image(file_path: str) -> dict[str,str] :
     path = validate_path(file_path)
     cmd = ["display", path]
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
+    result = run_command(cmd)
 
     content = {
         "command": f"display {path}",
@@ -205,15 +369,67 @@ def ls(directory_path: str = "."):
     target = validate_path(directory_path)
 
     cmd = ["ls", "-F", target]  # -F adds indicators like / for dirs
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_command(cmd)
 
     if result.returncode != 0:
         return f"Error listing directory: {result.stderr}"
 
     return result.stdout.strip()
 
+@tool("inventory")  #not cached, it reports what changed in the workspace since the previous call.
+@handle_tool_errors
+def inventory_tool(directory_path: str = ".", new: bool = False, file_type: str = None, min_size: int = None,
+                   max_size: int = None, duplicates: bool = False, max_results: int = 200) -> dict[str,str]:
+    """
+    Inventory of the workspace files with their size, type and hashes, updated incrementally.
+    Use it instead of ls and file on large extracted trees (binwalk, steghide outputs).
+    :param directory_path: only files under this directory
+    :param new: only files added or changed since the previous inventory call
+    :param file_type: only files of this type: png, jpeg, zip, gzip, elf, pdf, text, data...
+    :param min_size: only files of at least this many bytes
+    :param max_size: only files of at most this many bytes
+    :param duplicates: list the groups of files with identical content instead
+    :param max_results: files listed
+    :return: the matching files, one per line: size, type, sha256 prefix and path
+    """
+
+    from Utils.inventory import workspace_inventory
+
+    path = validate_path(directory_path)
+    under = Path(path).relative_to(base_path()).as_posix()
+    inventory = workspace_inventory()
+    previous = inventory.last_scan()
+    scan = inventory.update()
+
+    lines = [f"{scan.files} files in the workspace: {scan.added} added, {scan.changed} changed, "
+             f"{scan.removed} removed since the previous inventory ({scan.seconds:.2f}s)"]
+
+    if duplicates:
+        groups = inventory.duplicates(under)
+        lines.append(f"{len(groups)} groups of identical files under {under}:")
+        for group in groups[:max_results]:
+            lines.append(f"{group[0].size} bytes {group[0].type} {group[0].sha256[:12]}: "
+                         + ", ".join(entry.path for entry in group))
+    else:
+        entries, total = inventory.query(under, since=previous if new else None, file_type=file_type,
+                                         min_size=min_size, max_size=max_size, limit=max_results)
+        lines.append(f"{total} matching files under {under}" + (f", first {len(entries)}:" if total > len(entries) else ":"))
+        lines += [f"{entry.size:>12} {entry.type:<8} {entry.sha256[:12]} {entry.path}" for entry in entries]
+
+    output = OutputCapture()
+    output.write("\n".join(lines).encode())
+    output.close()
+
+    return {
+        "command": f"inventory {path}",
+        "terminal": output.text(),
+        "error": "",
+        **output.paging()
+    }
+
 @tool("file")
 @handle_tool_errors
+@cached_tool("file", resolve=validate_path)
 def get_file_type(file_path: str) -> dict[str,str]:
     """
     Uses the command "file" to retrieve information about the file, to aid in further processing.
@@ -225,11 +441,7 @@ def get_file_type(file_path: str) -> dict[str,str]:
 
     cmd = ["file", validate_path(file_path)]
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
+    result = run_command(cmd)
 
     info(f"Command used : {' '.join(cmd)}")
 
@@ -252,22 +464,43 @@ def grep(file_path: str, pattern: str, options: str) -> dict[str,str]:
     :param options: options like "-i", "-r" or combined options like "-ril".
     :return:
     """
+    from Utils.search_index import grep_candidates
+
     path = validate_path(file_path)
 
     #validate options, let's freeball for now
 
     cmd = ["grep",options,pattern,path]
-
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True
-    )
+    if STATE_DIR_NAME not in Path(path).parts:
+        # Jarvas' own files are left out of searches, the workspace index does not hold them either.
+        cmd.insert(2, f"--exclude-dir={STATE_DIR_NAME}")
+
+    # Recursive searches only read the files the workspace index cannot rule out.
+    narrowed = grep_candidates(path, pattern, options) if GREP_INDEX else None
+    if narrowed is None:
+        result = run_command(cmd)
+        return {
+            "command": " ".join(cmd),
+            "terminal": result.stdout,
+            "error": result.stderr,
+            **result.paging()
+        }
+
+    candidates, total = narrowed
+    command = f"{' '.join(cmd)} (index: {len(candidates)} of {total} files read)"
+    if not candidates:
+        return {"command": command, "terminal": "", "error": ""}
+
+    # The candidates go through xargs, which splits them in command lines under ARG_MAX.
+    # -H, grep -r prefixes every line with its file, even when a single candidate is left in a batch.
+    result = run_command(["xargs", "-0", "grep", options] + ([] if "h" in options else ["-H"]) + ["--", pattern],
+                         input=b"\0".join(os.fsencode(candidate) for candidate in candidates))
 
     content = {
-        "command": " ".join(cmd),
+        "command": command,
         "terminal": result.stdout,
-        "error": result.stderr
+        "error": result.stderr,
+        **result.paging()
     }
 
     return content
@@ -286,22 +519,24 @@ def cat(file_path: str) -> dict[str,str]:
 
     cmd = ["cat", path]
 
-    result = subprocess.run(
-        cmd,
-        capture_output= True,
-        text = True
-    )
+    result = run_command(cmd)
 
     content = {
         "command": " ".join(cmd),
         "terminal": result.stdout,
-        "error": result.stderr
+        "error": result.stderr,
+        **result.paging()
     }
 
     return content
 
+
+EXIF_VOLATILE_TAGS = ("FileModifyDate", "FileAccessDate", "FileInodeChangeDate")
+
+
 @tool("exiftool")
 @handle_tool_errors
+@cached_tool("exiftool", resolve=validate_path)
 def exiftool(file_path: str) -> dict[str,str]:
     """
     exiftool command used to read metadata from files
@@ -311,18 +546,16 @@ def exiftool(file_path: str) -> dict[str,str]:
 
     path = validate_path(file_path)
 
-    cmd = ["exiftool", path]
+    # The file system dates change without the content, a cached result would serve stale ones.
+    cmd = ["exiftool"] + [option for tag in EXIF_VOLATILE_TAGS for option in ("-x", tag)] + [path]
 
-    result = subprocess.run(
-        cmd,
-        capture_output= True,
-        text = True
-    )
+    result = run_command(cmd)
 
     content = {
         "command": " ".join(cmd),
         "terminal": result.stdout,
-        "error": result.stderr
+        "error": result.stderr,
+        **result.paging()
     }
 
     return content
@@ -330,6 +563,7 @@ def exiftool(file_path: str) -> dict[str,str]:
 
 @tool("steghide")
 @handle_tool_errors
+@cached_tool("steghide", resolve=validate_path, bypass=lambda args: args["option"] != "info")
 def steghide(file_path: str, option: str, pass_phrase: str = None) -> dict[str,str]:
     """
     steghide tool use for inspecting and extracting files emmbeded with steghide
@@ -345,7 +579,7 @@ def steghide(file_path: str, option: str, pass_phrase: str = None) -> dict[str,s
 
     if option == "extract":
         cmd.extend(["-sf", path])
-        cmd.extend(["-xf", WORKING_DIR+"/steg_extract"])
+        cmd.extend(["-xf", str(base_path() / "steg_extract")])
     if option == "info":
         cmd.extend([path])
 
@@ -353,11 +587,7 @@ def steghide(file_path: str, option: str, pass_phrase: str = None) -> dict[str,s
     if pass_phrase:
         cmd.extend(["-p", pass_phrase])
 
-    result = subprocess.run(
-        cmd,
-        capture_output= True,
-        text = True
-    )
+    result = run_command(cmd)
 
     content = {
         "command": " ".join(cmd),
@@ -385,9 +615,23 @@ def base64_decode(string: str) -> dict[str,str]:
 
 
 
+@tool("read_output")
+@handle_tool_errors
+def read_output(output_handle: str, offset: int = 0) -> dict[str,str]:
+    """
+    Pages through the full output of a tool that was truncated.
+    :param output_handle: the output_handle returned by the truncated tool
+    :param offset: byte offset to read from, use next_offset of the previous page to continue
+    :return: one page of the output
+    """
+
+    return read_spilled(output_handle, offset)
+
+
+
 #--------------WORKER TOOLS--------------------------#
 
-TOOLS = [retrieve_data,get_file_type,binwalk_extract,ls,ffprobe_check,ffmpeg_extract,display_image,grep,update_rag,cat,exiftool,steghide,base64_decode]
+TOOLS = [retrieve_data,triage_tool,get_file_type,carve_scan,entropy_tool,strings_tool,binwalk_extract,ls,inventory_tool,ffprobe_check,ffmpeg_extract,display_image,grep,update_rag,cat,exiftool,steghide,base64_decode,read_output]
 
 
 
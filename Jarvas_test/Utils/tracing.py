@@ -0,0 +1,307 @@
+"""
+Spans for every request, graph step, LLM call and tool call, written as JSONL to Documents/Traces/<session>.jsonl.
+
+Summary of a session, run from Jarvas_test:
+
+    python -m Utils.tracing <session_id> --top 10
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from langchain_core.callbacks import BaseCallbackHandler
+from setup import TRACE_ENABLED
+
+
+current_file_dir = Path(__file__).resolve().parent
+
+trace_storage_path = current_file_dir.parent / "Documents" / "Traces"
+
+# Span of the code running in this context, parent of the spans opened inside it.
+_current = ContextVar("span", default=None)
+
+# Records waiting to be appended by the writer thread, spans never wait on the disk (async nodes included).
+_records = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+# Tool arguments never written to the traces (steghide pass_phrase...), and the longest value kept.
+SENSITIVE_ARG = re.compile(r"pass|secret|token|key|credential|auth", re.IGNORECASE)
+MAX_ARG_CHARS = 200
+
+
+def trace_args(args: dict) -> dict:
+    """Tool arguments as recorded in a span: secrets redacted, long values replaced by their length."""
+    recorded = {}
+    for name, value in (args or {}).items():
+        if SENSITIVE_ARG.search(name):
+            recorded[name] = "<redacted>"
+        elif isinstance(value, str) and len(value) > MAX_ARG_CHARS:
+            recorded[name] = f"<{len(value)} chars>"
+        elif isinstance(value, (str, int, float, bool)) or value is None:
+            recorded[name] = value
+        else:
+            recorded[name] = f"<{type(value).__name__}>"
+    return recorded
+
+
+def _drain() -> None:
+    """Writer thread: appends the queued records, one open per session file and batch."""
+    while True:
+        batch = [_records.get()]
+        while True:
+            try:
+                batch.append(_records.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            lines = defaultdict(list)
+            for path, record in batch:
+                lines[path].append(json.dumps(record, default=str))
+            for path, records in lines.items():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a") as f:
+                    f.write("\n".join(records) + "\n")
+        except OSError:
+            pass        # tracing never breaks a request
+        finally:
+            for _ in batch:
+                _records.task_done()
+
+
+def _write(record: dict) -> None:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_drain, name="trace-writer", daemon=True)
+                _writer.start()
+    _records.put((trace_storage_path / f"{record.get('session') or 'default'}.jsonl", record))
+
+
+def flush() -> None:
+    """Waits until every record so far is on disk."""
+    if _writer is not None:
+        _records.join()
+
+
+atexit.register(flush)
+
+
+def _open(kind: str, name: str, parent: dict | None, attrs: dict) -> dict:
+    return {
+        "trace": parent["trace"] if parent else uuid.uuid4().hex[:16],
+        "span": uuid.uuid4().hex[:16],
+        "parent": parent["span"] if parent else None,
+        "session": parent["session"] if parent else attrs.pop("session", None),
+        "kind": kind,
+        "name": name,
+        "start": time.time(),
+        **attrs
+    }
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    """
+    Records the block as a span (kind: request, node, tool...). Yields the record, fields can be added to it.
+    A request span starts a trace, pass it session=<thread id>.
+    """
+    if not TRACE_ENABLED:
+        yield {}
+        return
+
+    record = _open(kind, name, _current.get(), attrs)
+    token = _current.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = repr(e)[:300]
+        raise
+    finally:
+        record["duration_s"] = round(time.perf_counter() - start, 6)
+        _current.reset(token)
+        _write(record)
+
+
+def add_usage(cpu_s: float = None, max_rss_kb: int = None, output_bytes: int = None) -> None:
+    """Adds the resources of a subprocess to the current span (a tool may run several)."""
+    record = _current.get()
+    if record is None:
+        return
+    if cpu_s is not None:
+        record["cpu_s"] = round(record.get("cpu_s", 0) + cpu_s, 6)
+    if max_rss_kb is not None:
+        record["max_rss_kb"] = max(record.get("max_rss_kb", 0), max_rss_kb)
+    if output_bytes is not None:
+        record["output_bytes"] = record.get("output_bytes", 0) + output_bytes
+
+
+def _describe_update(record: dict, update) -> None:
+    if isinstance(update, dict):
+        for key in ("status", "next_step"):
+            if update.get(key) is not None:
+                record[key] = str(update[key])
+        record["messages"] = len(update.get("messages") or [])
+
+
+def traced_node(name: str):
+    """Decorator recording a graph node (sync or async) as a node span, with the status it returned."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span("node", name) as record:
+                    update = await func(*args, **kwargs)
+                    _describe_update(record, update)
+                    return update
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span("node", name) as record:
+                update = func(*args, **kwargs)
+                _describe_update(record, update)
+                return update
+        return wrapper
+    return decorator
+
+
+class LLMTracer(BaseCallbackHandler):
+
+    """
+    Callback recording every LLM call as an llm span with its token counts.
+    Passed in the graph config, so it sees the calls of every node.
+    """
+
+    run_inline = True       # runs in the caller context, the parent span is the node calling the LLM
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def _start(self, serialized, run_id, metadata):
+        if not TRACE_ENABLED:
+            return
+        metadata = metadata or {}
+        name = metadata.get("ls_model_name") or (serialized or {}).get("name") or "llm"
+        record = _open("llm", name, _current.get(), {"node": metadata.get("langgraph_node")})
+        with self._lock:
+            self._runs[run_id] = (record, time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(serialized, run_id, metadata)
+
+    def _end(self, run_id, **fields):
+        with self._lock:
+            entry = self._runs.pop(run_id, None)
+        if entry is None:
+            return
+        record, start = entry
+        record.update(fields)
+        record["duration_s"] = round(time.perf_counter() - start, 6)
+        _write(record)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                message_usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                for key in ("input_tokens", "output_tokens"):
+                    usage[key] = usage.get(key, 0) + message_usage.get(key, 0)
+        self._end(run_id, **usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error)[:300])
+
+
+LLM_TRACER = LLMTracer()
+
+
+#-------SESSION SUMMARY-------
+
+def load_spans(session_id: str) -> list[dict]:
+    flush()
+    path = trace_storage_path / f"{session_id}.jsonl"
+    if not path.is_file():
+        raise SystemExit(f"No trace for session {session_id} ({path})")
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(spans: list[dict], top: int = 10) -> str:
+    by_kind = defaultdict(list)
+    for record in spans:
+        by_kind[record["kind"]].append(record)
+
+    requests = sorted(by_kind["request"], key=lambda r: r["start"])
+    wall = sum(r["duration_s"] for r in requests)
+    llm = sum(r["duration_s"] for r in by_kind["llm"])
+    tools = sum(r["duration_s"] for r in by_kind["tool"])
+    share = lambda seconds: f"{seconds / wall:5.0%}" if wall else "  n/a"
+
+    lines = [
+        f"{len(requests)} requests, {wall:.1f}s wall",
+        f"  LLM    {llm:8.1f}s {share(llm)}  {len(by_kind['llm'])} calls, "
+        f"{sum(r.get('input_tokens', 0) for r in by_kind['llm'])} tokens in, "
+        f"{sum(r.get('output_tokens', 0) for r in by_kind['llm'])} tokens out",
+        f"  tools  {tools:8.1f}s {share(tools)}  {len(by_kind['tool'])} calls, "
+        f"{sum(r.get('cpu_s', 0) for r in by_kind['tool']):.1f}s subprocess cpu (calls overlap, shares can pass 100%)",
+        "",
+        "slowest tools:",
+        f"  {'tool':<16}{'calls':>6}{'total s':>10}{'max s':>9}{'mean s':>9}{'max rss MB':>12}",
+    ]
+
+    per_tool = defaultdict(list)
+    for record in by_kind["tool"]:
+        per_tool[record["name"]].append(record)
+    ranked = sorted(per_tool.items(), key=lambda item: -sum(r["duration_s"] for r in item[1]))
+    for name, records in ranked[:top]:
+        durations = [r["duration_s"] for r in records]
+        rss = max(r.get("max_rss_kb", 0) for r in records) / 1024
+        lines.append(f"  {name:<16}{len(records):>6}{sum(durations):>10.2f}{max(durations):>9.2f}"
+                     f"{sum(durations) / len(durations):>9.2f}{rss:>12.1f}")
+
+    # Worker steps that came back incomplete from the auditor are the retries of a request.
+    children = defaultdict(list)
+    for record in spans:
+        children[record["trace"]].append(record)
+
+    lines += ["", "per request:", f"  {'#':>3}{'wall s':>9}{'llm s':>9}{'tools s':>9}{'llm calls':>11}{'retries':>9}"]
+    for number, request in enumerate(requests, 1):
+        trace = children[request["trace"]]
+        lines.append(
+            f"  {number:>3}{request['duration_s']:>9.2f}"
+            f"{sum(r['duration_s'] for r in trace if r['kind'] == 'llm'):>9.2f}"
+            f"{sum(r['duration_s'] for r in trace if r['kind'] == 'tool'):>9.2f}"
+            f"{sum(1 for r in trace if r['kind'] == 'llm'):>11}"
+            f"{sum(1 for r in trace if r['name'] == 'worker' and r.get('status') == 'incomplete'):>9}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session", nargs="?", default="1", help="session id (thread id), 1 is the default session")
+    parser.add_argument("--top", type=int, default=10, help="tools listed")
+    args = parser.parse_args()
+
+    print(f"session {args.session}: " + summarize(load_spans(args.session), args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import hashlib
+import mmap
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import numpy as np
+from Agent.auditor import FLAG_PATTERN
+from Utils.carving import SignatureScanner, measure, Hit
+from Utils.entropy import CHUNK_SIZE, window_counts, counts_entropy, entropy_ranges, EntropyRange
+from Utils.strings_scan import scan_buffer
+
+
+BLOCK_SIZE = 4 * 1024 * 1024        # bytes read at a time, a multiple of ENTROPY_WINDOW
+ENTROPY_WINDOW = 4096
+STRING_MIN_LENGTH = 8
+STRING_SAMPLES = 15
+MAX_FLAGS = 20
+FLAG_OVERLAP = 256                  # bytes of the previous block searched again, for flags crossing a boundary
+
+# The flag formats the auditor recognizes, on raw bytes. Without its leading \b: in binary data a
+# flag often follows letters or digits (file names in archives, packed strings).
+FLAG_BYTES_PATTERN = re.compile(FLAG_PATTERN.pattern.removeprefix(r"\b").encode(), re.IGNORECASE)
+# Every flag format contains one of these, lowercase. Found with bytes.find, the regex only runs around them.
+FLAG_MARKERS = (b"ctf{", b"flag{", b"htb{", b"thm{")
+FLAG_PREFIX = 8                     # bytes before a marker where the flag may start (picoCTF{)
+
+IMAGE_TYPES = {"png", "jpeg", "gif", "bmp", "webp"}
+MEDIA_TYPES = {"wav", "avi", "mp4", "mkv", "ogg", "flac", "mp3"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+MEDIA_EXTENSIONS = {".wav", ".avi", ".mp4", ".mov", ".mkv", ".webm", ".ogg", ".flac", ".mp3", ".m4a"}
+
+
+#-------ANALYZERS (each sees every block once, in order)-------
+
+class HashAnalyzer:
+
+    def __init__(self):
+        self.hashes = {name: hashlib.new(name) for name in ("md5", "sha1", "sha256")}
+
+    def feed(self, pool, block: bytes) -> list:
+        """One task per hash, hashlib releases the GIL on large buffers so they run side by side."""
+        return [pool.submit(h.update, block) for h in self.hashes.values()]
+
+    def result(self) -> dict:
+        return {name: h.hexdigest() for name, h in self.hashes.items()}
+
+
+class MagicAnalyzer:
+
+    def __init__(self):
+        self.scanner = SignatureScanner()
+        self.found = []
+
+    def feed(self, block: bytes, offset: int) -> None:
+        self.found += self.scanner.feed(block)
+
+    def finish(self) -> None:
+        self.found += self.scanner.finish()
+
+
+class EntropyAnalyzer:
+
+    """Byte histogram of the whole file and entropy of every ENTROPY_WINDOW bytes."""
+
+    def __init__(self, size: int):
+        self.window = max(1, min(ENTROPY_WINDOW, size))
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self.parts = []
+
+    def feed(self, block: bytes, offset: int) -> None:
+        # The file histogram is the sum of the window counts, the bytes are only histogrammed once.
+        view = memoryview(block)
+        per_chunk = max(1, CHUNK_SIZE // self.window)
+        windows = len(block) // self.window      # a last partial window is left out of the entropies
+        for first in range(0, windows, per_chunk):
+            count = min(per_chunk, windows - first)
+            counts = window_counts(view[first * self.window:], self.window, self.window, count)
+            self.histogram += counts.sum(axis=0)
+            self.parts.append(counts_entropy(counts, self.window))
+        if len(block) > windows * self.window:
+            self.histogram += np.bincount(np.frombuffer(block, dtype=np.uint8, offset=windows * self.window),
+                                          minlength=256)
+
+    @property
+    def entropies(self) -> np.ndarray:
+        return np.concatenate(self.parts) if self.parts else np.zeros(0)
+
+    def overall(self) -> float:
+        total = self.histogram.sum()
+        p = self.histogram[self.histogram > 0] / total if total else np.zeros(0)
+        return float(-(p * np.log2(p)).sum())
+
+
+class StringsAnalyzer:
+
+    """Counts printable strings and keeps a uniform sample of them (reservoir, seeded)."""
+
+    def __init__(self):
+        self.count = 0
+        self.sample = []
+        self._rng = random.Random(0)
+
+    def feed(self, block: bytes, offset: int) -> None:
+        # Strings cut by a block boundary are seen as two, fine for a sample.
+        for position, _, text in scan_buffer(block, 0, len(block), STRING_MIN_LENGTH):
+            self.count += 1
+            if len(self.sample) < STRING_SAMPLES:
+                self.sample.append((offset + position, text))
+            else:
+                slot = self._rng.randrange(self.count)
+                if slot < STRING_SAMPLES:
+                    self.sample[slot] = (offset + position, text)
+
+
+class FlagAnalyzer:
+
+    def __init__(self):
+        self.flags = {}
+        self._tail = b""
+
+    def feed(self, block: bytes, offset: int) -> None:
+        data = self._tail + block
+        base = offset - len(self._tail)
+        lowered = data.lower()
+        for marker in FLAG_MARKERS:
+            position = lowered.find(marker)
+            while position >= 0 and len(self.flags) < MAX_FLAGS:
+                match = FLAG_BYTES_PATTERN.search(data, max(0, position - FLAG_PREFIX), position + FLAG_OVERLAP)
+                if match:
+                    self.flags.setdefault(base + match.start(), match.group().decode("ascii", errors="replace"))
+                position = lowered.find(marker, position + 1)
+        self._tail = block[-FLAG_OVERLAP:]
+
+
+@dataclass
+class Triage:
+    path: str
+    size: int
+    hashes: dict = field(default_factory=dict)
+    file_type: Hit | None = None           # signature at offset 0
+    embedded: list[Hit] = field(default_factory=list)
+    entropy: float = 0.0
+    printable: float = 0.0                  # share of printable ASCII bytes
+    entropy_ranges: list[EntropyRange] = field(default_factory=list)
+    strings: int = 0
+    string_samples: list = field(default_factory=list)
+    flags: list = field(default_factory=list)
+
+    @property
+    def kind(self) -> str | None:
+        """image, media or None, decides which external tools are worth running."""
+        name = self.file_type.name if self.file_type else None
+        extension = os.path.splitext(self.path)[1].lower()
+        if name in IMAGE_TYPES or (name is None and extension in IMAGE_EXTENSIONS):
+            return "image"
+        if name in MEDIA_TYPES or (name is None and extension in MEDIA_EXTENSIONS):
+            return "media"
+        return None
+
+
+def triage(path: str, max_hits: int = 50) -> Triage:
+    """
+    Reads the file once, block by block, every block goes to all the analyzers: hashes, magic
+    signatures, entropy, printable strings and flag patterns. Each hash runs in a thread of its own
+    while the other analyzers work on the same block, and the next block is read meanwhile.
+    Lengths of the embedded files are then read from their headers, a few small reads.
+    """
+    size = os.path.getsize(path)
+    hashes, magic, entropy = HashAnalyzer(), MagicAnalyzer(), EntropyAnalyzer(size)
+    strings, flags = StringsAnalyzer(), FlagAnalyzer()
+    local = (magic, entropy, strings, flags)
+
+    def analyze_local(block, offset):
+        for analyzer in local:
+            analyzer.feed(block, offset)
+
+    with open(path, "rb") as f, ThreadPoolExecutor(max_workers=4, thread_name_prefix="triage") as pool:
+        offset, block = 0, f.read(BLOCK_SIZE)
+        while block:
+            running = hashes.feed(pool, block) + [pool.submit(analyze_local, block, offset)]
+            following = f.read(BLOCK_SIZE)
+            for future in wait(running).done:
+                future.result()
+            offset += len(block)
+            block = following
+        magic.finish()
+
+        hits = []
+        if magic.found:
+            # Length estimators need random access, the headers they read are few and small.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hits = measure(mm, magic.found, size, max_hits)
+
+    total = entropy.histogram.sum()
+    printable = entropy.histogram[0x20:0x7f].sum() + entropy.histogram[[0x09, 0x0a, 0x0d]].sum()
+    entropies = entropy.entropies
+    return Triage(
+        path=path,
+        size=size,
+        hashes=hashes.result(),
+        file_type=next((hit for hit in hits if hit.offset == 0), None),
+        embedded=[hit for hit in hits if hit.offset != 0],
+        entropy=entropy.overall(),
+        printable=float(printable / total) if total else 0.0,
+        entropy_ranges=entropy_ranges(entropies, entropy.window, entropy.window, size) if len(entropies) else [],
+        strings=strings.count,
+        string_samples=sorted(strings.sample),
+        flags=sorted(flags.flags.items()),
+    )
@@ -0,0 +1,62 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from setup import WORKING_DIR
+
+
+STATE_DIR_NAME = ".jarvas"
+
+# Workspace used when no session is active (single-session use, scripts).
+DEFAULT_WORKSPACE = Path(WORKING_DIR).resolve()
+
+# Workspace of the session running in the current context. LangGraph copies the context into its
+# node threads, tool_node copies it into the tool threads.
+_current = ContextVar("workspace", default=None)
+
+
+def base_path() -> Path:
+    """Root the tools are confined to, the working dir of the current session."""
+    return _current.get() or DEFAULT_WORKSPACE
+
+
+def state_dir() -> Path:
+    """Jarvas' own files for the current workspace (spilled outputs, indexes), hidden from the analyst."""
+    return base_path() / STATE_DIR_NAME
+
+
+def walk_files(root) -> dict[str, tuple[int, int]]:
+    """
+    (size, mtime_ns) of the regular files under root, by path. Symlinks are not followed (like grep -r),
+    unreadable directories are skipped, and so are Jarvas' own files.
+    """
+    found = {}
+    pending = [str(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == STATE_DIR_NAME:
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+    return found
+
+
+@contextmanager
+def use_workspace(path):
+    """Runs the block with path as the workspace."""
+    token = _current.set(Path(path).resolve())
+    try:
+        yield
+    finally:
+        _current.reset(token)
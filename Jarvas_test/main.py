@@ -1,24 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
 from Agent.graph import Jarvas
+from Agent.sessions import DEFAULT_SESSION
 from logging import basicConfig, INFO, DEBUG, WARNING
 
 basicConfig(level=INFO, format='%(levelname)s: %(message)s')
 
 
-#Also set up the workplace for everything else
+HELP = """Commands:
+  /new [name]        start a new investigation in its own workspace
+  /sessions          list the open investigations
+  /switch <id>       continue another investigation
+  /resume <id>       reopen a closed investigation
+  /close <id>        close an investigation (its history is kept), the current one by default
+  /bg <message>      run a message in the background, keep working on other sessions
+  /help              this message"""
+
+
+def print_answer(session_id: str, result: str):
+    print("-------")
+    print(f"Jarvas [{session_id}]: {result}")
+    print("-------")
+
+
+def render_stream(events, session_id: str):
+    """Prints the events of Jarvas.stream as they arrive, tokens inline."""
+    in_tokens = False
+    for event in events:
+        kind = event["event"]
+        if kind == "token":
+            print(event["text"], end="", flush=True)
+            in_tokens = True
+            continue
+        if in_tokens:
+            print()
+            in_tokens = False
+
+        if kind == "node":
+            print(f"  [{event['node']}]", flush=True)
+        elif kind == "tool_start":
+            print(f"  > {event['name']} {event['args']}", flush=True)
+        elif kind == "tool_end":
+            print(f"  < {event['name']} done in {event['seconds']}s", flush=True)
+        elif kind == "answer":
+            print_answer(session_id, event["text"])
+
 
 def main():
 
     my_bot = Jarvas()
+    background = ThreadPoolExecutor(thread_name_prefix="session")
+    current = DEFAULT_SESSION
+
+    def run_background(session_id: str, message: str):
+        try:
+            print_answer(session_id, my_bot.call(message, session_id))
+        except Exception as e:
+            print(f"\nSession {session_id} failed: {e}")
 
     while True:
-        query = input(" > ")
+        query = input(f" [{current}] > ")
+        command, _, argument = query.strip().partition(" ")
 
-        result = my_bot.call(query)
-        print("-------")
-        print(f"Jarvas: {result}")
-        print("-------")
+        try:
+            if command == "/help":
+                print(HELP)
+            elif command == "/new":
+                session = my_bot.create_session(name=argument or None)
+                current = session.session_id
+                print(f"Session {session.name} ({current}), workspace {session.working_dir}")
+            elif command == "/sessions":
+                for session in my_bot.list_sessions():
+                    print(f"{'*' if session.session_id == current else ' '} {session.session_id}  "
+                          f"{session.name}  {session.working_dir}")
+            elif command == "/switch":
+                current = my_bot.get_session(argument).session_id
+            elif command == "/resume":
+                current = my_bot.resume_session(argument).session_id
+            elif command == "/close":
+                target = argument or current
+                if target == DEFAULT_SESSION:
+                    # The REPL falls back to it, closed it would refuse every prompt.
+                    raise ValueError("The default session cannot be closed.")
+                my_bot.close_session(target)
+                if target == current:
+                    current = DEFAULT_SESSION
+                    print(f"Session {target} closed, back to the default session ({current})")
+            elif command == "/bg":
+                background.submit(run_background, current, argument)
+            else:
+                render_stream(my_bot.stream(query, current), current)
+        except ValueError as e:
+            print(f"Error: {e}")
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -7,3 +7,46 @@ load_dotenv()
 API_KEY = os.getenv("API_KEY")
 WORKING_DIR = os.getenv("WORKING_DIR")
 
+# Tool execution limits (tool_node)
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "4"))      # tool calls running at the same time
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "300"))          # seconds allowed for a single tool call
+TOOL_OUTPUT_BUDGET = int(os.getenv("TOOL_OUTPUT_BUDGET", "16000"))  # bytes of tool output kept for the LLM
+TOOL_SPILL_MB = int(os.getenv("TOOL_SPILL_MB", "256"))          # full outputs kept per workspace for read_output, oldest dropped first
+
+# On-disk tool result cache (Utils/cache.py)
+TOOL_CACHE_MB = int(os.getenv("TOOL_CACHE_MB", "256"))
+
+# Embedding cache (Agent/embeddings.py), vectors kept in memory on top of the SQLite store
+EMBEDDING_CACHE_ITEMS = int(os.getenv("EMBEDDING_CACHE_ITEMS", "2048"))
+
+# RAG ingestion (Utils/documents.py)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))        # chunks per embedding request
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "2"))   # embedding requests running at the same time
+
+# Context windows sent to the LLMs (Agent/context.py), in estimated tokens
+SUPERVISOR_CONTEXT_TOKENS = int(os.getenv("SUPERVISOR_CONTEXT_TOKENS", "8000"))
+WORKER_CONTEXT_TOKENS = int(os.getenv("WORKER_CONTEXT_TOKENS", "16000"))
+OLD_TOOL_OUTPUT_CHARS = int(os.getenv("OLD_TOOL_OUTPUT_CHARS", "1500"))   # older tool outputs are cut to this
+
+# Session checkpoints (Agent/checkpointer.py), checkpoints kept per thread (0 keeps all)
+CHECKPOINT_RETENTION = int(os.getenv("CHECKPOINT_RETENTION", "20"))
+
+# Sessions (Agent/graph.py Jarvas), graphs running at the same time across sessions
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "8"))
+
+# Local intent router in front of the classifier LLM (Agent/router.py)
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "0.75"))   # under this confidence the LLM decides, over 1 disables
+ROUTER_CACHE_ITEMS = int(os.getenv("ROUTER_CACHE_ITEMS", "512"))
+
+# Tracing (Utils/tracing.py), spans written to Documents/Traces/<session>.jsonl
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+
+# Per-request budget of the worker loop (Agent/budget.py), the worker stops with a partial answer. 0 disables a limit
+REQUEST_MAX_ITERATIONS = int(os.getenv("REQUEST_MAX_ITERATIONS", "12"))       # worker LLM turns
+REQUEST_MAX_LLM_CALLS = int(os.getenv("REQUEST_MAX_LLM_CALLS", "30"))         # worker and auditor calls
+REQUEST_MAX_SECONDS = float(os.getenv("REQUEST_MAX_SECONDS", "900"))          # wall time of the request
+REQUEST_MAX_TOOL_SECONDS = float(os.getenv("REQUEST_MAX_TOOL_SECONDS", "600"))  # time spent running tools
+REQUEST_MAX_REPEATS = int(os.getenv("REQUEST_MAX_REPEATS", "2"))              # tool calls asked again with the same arguments
+
+# Trigram index of the workspace behind the grep tool (Utils/search_index.py), stored in <workspace>/.jarvas
+GREP_INDEX = os.getenv("GREP_INDEX", "1") == "1"
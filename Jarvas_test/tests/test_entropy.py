@@ -0,0 +1,43 @@
+import numpy as np
+
+from Utils import entropy
+
+
+def _reference(data: bytes, window: int, stride: int) -> np.ndarray:
+    """Entropy of every window computed one by one."""
+    values = []
+    for start in range(0, len(data) - window + 1, stride):
+        counts = np.bincount(np.frombuffer(data[start:start + window], dtype=np.uint8), minlength=256)
+        p = counts[counts > 0] / window
+        values.append(-(p * np.log2(p)).sum())
+    return np.array(values)
+
+
+def test_small_gcd_passes_stay_bounded(tmp_path, monkeypatch):
+    data = np.random.default_rng(0).integers(0, 256, 64 * 1024, dtype=np.uint8).tobytes()
+    path = tmp_path / "blob.bin"
+    path.write_bytes(data)
+
+    monkeypatch.setattr(entropy, "CHUNK_SIZE", 16 * 1024)
+    passes = []
+    window_entropy = entropy.window_entropy
+
+    def recording(buf, window, stride, count):
+        passes.append(count)
+        return window_entropy(buf, window, stride, count)
+
+    monkeypatch.setattr(entropy, "window_entropy", recording)
+
+    # gcd(1024, 3) is 1, every window is histogrammed on its own.
+    values, window, stride = entropy.entropy_map(str(path), window=1024, stride=3)
+
+    assert max(passes) <= entropy.CHUNK_SIZE // window
+    np.testing.assert_allclose(values, _reference(data, 1024, 3))
+
+
+def test_block_and_direct_counts_agree():
+    data = np.random.default_rng(1).integers(0, 8, 32 * 1024, dtype=np.uint8).tobytes()
+    with_blocks = entropy.window_counts(data, 4096, 512, 50)
+    one_by_one = np.array([np.bincount(np.frombuffer(data[i * 512:i * 512 + 4096], dtype=np.uint8), minlength=256)
+                           for i in range(50)])
+    np.testing.assert_array_equal(with_blocks, one_by_one)